@@ -1,12 +1,73 @@
 import os
-from flask import Flask, jsonify, request, send_from_directory
+import base64
+import atexit
+import bisect
+import csv
+import hashlib
+import heapq
+import hmac
+import io
+import json
+import math
+import mimetypes
+import random
+import re
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import zlib
+import click
+from flask import Flask, Request, g, has_app_context, jsonify, make_response, request, send_file, send_from_directory, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from markupsafe import escape
+from sqlalchemy import Select, event, func, insert, select, text, tuple_, type_coerce, update
 import jwt
 from datetime import timedelta
 from datetime import datetime
 from zoneinfo import ZoneInfo
+from werkzeug.exceptions import ClientDisconnected
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from functools import partial, wraps
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+# orjson 为可选依赖，没有安装时使用标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# brotli、zstandard 为可选依赖，没有安装时只协商 gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# fcntl 只在 POSIX 上可用；Windows 只以单进程运行，上传会话改用进程内的锁
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Pillow 为可选依赖，没有安装时缩略图接口直接返回原图
+try:
+    from PIL import Image, ImageOps, features as pil_features
+except ImportError:
+    Image = None
 
 """
     flask-bootstrap-term-demo v1
@@ -31,6 +92,113 @@ full_db_path = os.path.abspath(db_path)
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{full_db_path}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# SQLite 连接配置：每个新连接都会执行下面的 PRAGMA
+app.config['SQLITE_PRAGMAS'] = {
+    'journal_mode': 'WAL',          # 读写互不阻塞
+    'synchronous': 'NORMAL',        # WAL 模式下只在 checkpoint 时 fsync
+    'busy_timeout': 5000,           # 遇到锁时等待的毫秒数，而不是立即报 database is locked
+    'mmap_size': 268435456,         # 256MB 内存映射读
+    'cache_size': -65536,           # 每个连接 64MB 页缓存（负数单位为 KB）
+    'temp_store': 'MEMORY',         # 临时表和排序放在内存里
+}
+
+# 请求指标（/metrics）：按路由统计延迟直方图、SQL 语句数和耗时、读取的行数、响应字节数
+app.config['METRICS_ENABLED'] = False
+app.config['METRICS_LATENCY_BUCKETS'] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# 多个 worker 共用一个端口时，/metrics 由哪个进程应答是随机的：开启后各进程定期把自己的计数写到
+# METRICS_SHARED_FOLDER，/metrics 汇总所有进程（包括已经退出的）的计数；serve.py 多 worker 时自动开启
+app.config['METRICS_SHARED'] = False
+app.config['METRICS_SHARED_FOLDER'] = os.path.join(db_dir, 'metrics')
+app.config['METRICS_SNAPSHOT_INTERVAL'] = 5     # 各进程写出计数的间隔（秒）
+
+# 单个请求的采样分析：开启后带 X-Profile: 1 请求头的请求会把采样到的调用栈写到 PROFILE_FOLDER
+app.config['PROFILER_ENABLED'] = False
+app.config['PROFILER_INTERVAL'] = 0.001     # 采样间隔（秒）
+app.config['PROFILE_FOLDER'] = './profiles'
+
+# 限流：按接口配置令牌桶（容量, 周期秒数），即每个客户端每个周期最多请求 容量 次，令牌匀速补充
+# 登录用户按用户 ID 计数，未登录按 IP 计数；超过限制直接返回 429
+# memory 为进程内计数；sqlite 为本机共享计数，多进程部署时各进程合计
+app.config['RATE_LIMIT_ENABLED'] = True
+app.config['RATE_LIMIT_BACKEND'] = 'memory'
+app.config['RATE_LIMIT_PATH'] = os.path.join(db_dir, 'rate_limit.db')
+app.config['RATE_LIMITS'] = {
+    'login': (10, 60),
+    'user_register': (5, 60),
+    'change_password': (5, 60),
+    'post_test_data': (120, 60),
+    'post_test_data_bulk': (10, 60),
+    'add_users_bulk': (10, 60),
+    'add_news_bulk': (10, 60),
+    'upload_file': (30, 60),
+    'create_upload_session': (30, 60),
+}
+
+# 每个进程同时处理的请求数上限，超过时立即返回 503，而不是排队等待；None 为不限制
+app.config['MAX_CONCURRENT_REQUESTS'] = 64
+
+# 当前线程正在处理的请求的统计，没有开启指标时为 None
+metrics_local = threading.local()
+
+def count_rows_fetched(count):
+    stats = getattr(metrics_local, 'stats', None)
+    if stats is not None:
+        stats.rows += count
+
+# 统计从 SQLite 读取的行数，ORM 对象和按列查询的元组都会经过这里
+class MetricsCursor(sqlite3.Cursor):
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            count_rows_fetched(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        count_rows_fetched(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        count_rows_fetched(len(rows))
+        return rows
+
+class MetricsConnection(sqlite3.Connection):
+    def cursor(self, factory=MetricsCursor):
+        return super().cursor(factory)
+
+# 连接池大小与每个进程的线程数保持一致
+app.config['DB_POOL_SIZE'] = 8
+app.config['DB_MAX_OVERFLOW'] = 4
+app.config['DB_POOL_TIMEOUT'] = 10
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': app.config['DB_POOL_SIZE'],
+    'max_overflow': app.config['DB_MAX_OVERFLOW'],
+    'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+    'pool_pre_ping': False,
+    'connect_args': {
+        'check_same_thread': False,
+        'timeout': app.config['SQLITE_PRAGMAS']['busy_timeout'] / 1000,
+        'factory': MetricsConnection,
+    },
+}
+
+# 只读接口使用单独的只读连接池，不占用写连接；WAL 下读连接互不阻塞，池可以比写连接池大
+app.config['DB_READ_ROUTING'] = True
+app.config['DB_READ_POOL_SIZE'] = 8
+app.config['DB_READ_MAX_OVERFLOW'] = 8
+if app.config['DB_READ_ROUTING']:
+    app.config['SQLALCHEMY_BINDS'] = {
+        # 绑定写成字符串时 Flask-SQLAlchemy 不会套用 SQLALCHEMY_ENGINE_OPTIONS，连接池参数要写在绑定里
+        'read': {
+            **app.config['SQLALCHEMY_ENGINE_OPTIONS'],
+            'url': f'sqlite:///file:{full_db_path}?mode=ro&uri=true',
+            'pool_size': app.config['DB_READ_POOL_SIZE'],
+            'max_overflow': app.config['DB_READ_MAX_OVERFLOW'],
+        }
+    }
+
 # 配置文件上传目录
 UPLOAD_FOLDER = './upload'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -40,11 +208,636 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['ALLOWED_EXTENSIONS'] = set()    # 不限制文件类型
 app.config['MAX_CONTENT_LENGTH'] = None     # 不限制大小
 
-db = SQLAlchemy(app)
+# 上传中的临时文件目录（和上传目录在同一个文件系统上，完成后直接重命名，不再复制）
+UPLOAD_PARTIAL_FOLDER = os.path.join(UPLOAD_FOLDER, '.partial')
+if not os.path.exists(UPLOAD_PARTIAL_FOLDER):
+    os.makedirs(UPLOAD_PARTIAL_FOLDER)
+
+app.config['UPLOAD_PARTIAL_FOLDER'] = UPLOAD_PARTIAL_FOLDER
+
+# 按内容寻址的文件存储目录：blobs/<sha256 前两位>/<第三、四位>/<sha256>，相同内容只存一份
+UPLOAD_BLOB_FOLDER = os.path.join(UPLOAD_FOLDER, 'blobs')
+if not os.path.exists(UPLOAD_BLOB_FOLDER):
+    os.makedirs(UPLOAD_BLOB_FOLDER)
+
+app.config['UPLOAD_BLOB_FOLDER'] = UPLOAD_BLOB_FOLDER
+app.config['UPLOAD_CHUNK_SIZE'] = 1024 * 1024       # 流式读写的块大小（字节）
+app.config['UPLOAD_SESSION_MAX_SIZE'] = None        # 分片上传会话的文件大小上限，None 为不限制
+app.config['UPLOAD_SESSION_TTL'] = 24 * 3600        # 分片上传会话多久没有写入就清理（秒）
+
+# HTTP 缓存：上传文件和带哈希的前端资源内容不会变化，可以长期缓存
+app.config['IMMUTABLE_MAX_AGE'] = 365 * 24 * 3600
+
+# 图片缩略图：请求的宽度向上取到最近的档位，超过最大档位按最大档位生成
+app.config['IMAGE_DERIVATIVE_SIZES'] = (160, 320, 640, 1280)
+app.config['IMAGE_DERIVATIVE_WEBP'] = True          # 浏览器支持时返回 WebP
+app.config['IMAGE_DERIVATIVE_QUALITY'] = 80
+app.config['IMAGE_DERIVATIVE_WORKERS'] = 2          # 生成缩略图的线程数
+app.config['IMAGE_DERIVATIVE_WAIT'] = 10            # 请求等待缩略图生成的最长时间（秒），超时返回原图
+app.config['IMAGE_DERIVATIVE_PREGENERATE'] = True   # 上传图片后在后台生成所有档位
+
+ALLOWED_UPLOAD_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.pdf', '.txt', '.docx', '.xlsx'}
+
+# 边写边计算大小和 SHA-256 的文件包装，关闭时如果没有被 detach 取走就删除临时文件
+class HashingFile:
+    def __init__(self, path, mode='w+b'):
+        self.path = path
+        self.file = open(path, mode)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.kept = False
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    # 写入完成，关闭文件并保留临时文件，返回其路径
+    def detach(self):
+        self.file.close()
+        self.kept = True
+        return self.path
+
+    def close(self):
+        self.file.close()
+        if not self.kept and os.path.exists(self.path):
+            os.remove(self.path)
+
+# multipart 上传的文件直接写进上传目录下的临时文件，而不是先缓存到系统临时目录
+class StreamingUploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        temp_path = os.path.join(app.config['UPLOAD_PARTIAL_FOLDER'], f"{uuid.uuid4()}.tmp")
+        return HashingFile(temp_path)
+
+app.request_class = StreamingUploadRequest
+
+# 新闻列表分页配置
+app.config['NEWS_PAGE_SIZE'] = 20           # 默认每页条数
+app.config['NEWS_MAX_PAGE_SIZE'] = 100      # 每页条数上限
+
+# 新闻浏览量写回配置（进程异常退出时最多丢失一个刷新周期内的计数）
+app.config['VIEW_COUNT_FLUSH_INTERVAL'] = 5     # 定时写回间隔（秒）
+app.config['VIEW_COUNT_FLUSH_THRESHOLD'] = 1000 # 累计未写回的浏览次数达到该值时立即写回
+
+# 热门/最新新闻排行榜配置
+app.config['HOT_NEWS_LIMIT'] = 3                # 排行榜保留的条数（N）
+app.config['HOT_NEWS_HALF_LIFE'] = 6 * 3600     # 热度半衰期（秒），越小越偏向最近的浏览
+app.config['HOT_NEWS_SYNC_INTERVAL'] = 30       # 排行榜和数据库对齐的间隔（秒），多进程时其他进程的新增/删除在这之后可见
+
+# 新闻全文搜索配置（FTS5）
+# trigram 分词可以直接匹配中文子串，但少于 3 个字的关键词无法走索引，会退回 LIKE 查询
+app.config['NEWS_SEARCH_TOKENIZER'] = 'trigram'
+app.config['NEWS_SEARCH_PAGE_SIZE'] = 10
+app.config['NEWS_SEARCH_MAX_PAGE_SIZE'] = 50
+
+# 只读 JSON 接口的响应缓存：memory 为进程内缓存；sqlite 为本机共享缓存，多进程之间失效同步；None 关闭
+app.config['RESPONSE_CACHE_BACKEND'] = 'memory'
+app.config['RESPONSE_CACHE_TTL'] = 30                           # 缓存有效期（秒）
+app.config['RESPONSE_CACHE_MAX_BYTES'] = 64 * 1024 * 1024       # 缓存总大小上限
+app.config['RESPONSE_CACHE_MAX_ENTRY_BYTES'] = 4 * 1024 * 1024  # 单个响应超过该大小不缓存
+app.config['RESPONSE_CACHE_PATH'] = os.path.join(db_dir, 'response_cache.db')
+
+# 响应压缩：按 Accept-Encoding 协商，优先级按 COMPRESSION_ALGORITHMS 的顺序（未安装的算法跳过）
+# 只压缩 COMPRESSIBLE_MIMETYPES 中的类型、超过 COMPRESSION_MIN_SIZE 的响应；流式响应边生成边压缩
+app.config['COMPRESSION_ENABLED'] = True
+app.config['COMPRESSION_ALGORITHMS'] = ('zstd', 'br', 'gzip')
+app.config['COMPRESSION_LEVELS'] = {'zstd': 3, 'br': 4, 'gzip': 6}
+app.config['COMPRESSION_MIN_SIZE'] = 1024
+# 静态文件在启动时预先压缩成 .gz / .br，只压缩一次，可以用最高压缩级别
+app.config['STATIC_COMPRESSION_LEVELS'] = {'br': 11, 'gzip': 9}
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'application/javascript', 'application/xml',
+    'image/svg+xml', 'text/css', 'text/csv', 'text/html', 'text/javascript', 'text/plain', 'text/xml',
+}
+
+# JSON 序列化：auto 表示安装了 orjson 就用 orjson，否则用标准库 json
+app.config['JSON_ENCODER_BACKEND'] = 'auto'
+app.config['JSON_STREAM_BATCH_SIZE'] = 1000     # 流式输出时每次从数据库取的行数
+
+# 批量写入接口：请求体为 JSON 数组或 NDJSON，按批 executemany，整个请求一个事务
+app.config['BULK_BATCH_SIZE'] = 1000            # 每批插入的行数
+app.config['BULK_MAX_ITEMS'] = 100000           # 单个请求最多的记录数
+app.config['BULK_MAX_USERS'] = 1000             # 批量导入用户单个请求最多的记录数，每条都要计算一次密码哈希（scrypt 约 60ms）
+
+# 导出接口：从数据库逐批读取，攒够 EXPORT_CHUNK_BYTES 再发给客户端
+app.config['EXPORT_BATCH_SIZE'] = 1000
+app.config['EXPORT_CHUNK_BYTES'] = 64 * 1024
+
+# 标记了 @read_only 的接口里，ORM 的 SELECT 走只读连接池，写入和 flush 仍然走主连接池
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and isinstance(clause, Select)
+                and has_app_context() and g.get('db_read_only') and 'read' in self._db.engines):
+            return self._db.engines['read']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record, read_only=False):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in app.config['SQLITE_PRAGMAS'].items():
+        # journal_mode 是数据库文件级别的设置，只由读写连接设置
+        if read_only and pragma == 'journal_mode':
+            continue
+        cursor.execute(f"PRAGMA {pragma} = {value}")
+    cursor.close()
+
+with app.app_context():
+    for bind_key, engine in db.engines.items():
+        event.listen(engine, 'connect', partial(apply_sqlite_pragmas, read_only=(bind_key == 'read')))
+
+# 只读接口装饰器
+def read_only(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return func(*args, **kwargs)
+    return wrapper
+
+class RequestStats:
+    __slots__ = ('start', 'sql_count', 'sql_time', 'rows', 'response_bytes')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.rows = 0
+        self.response_bytes = 0
+
+def before_sql_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(metrics_local, 'stats', None) is not None:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def after_sql_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = getattr(metrics_local, 'stats', None)
+    starts = conn.info.get('query_start')
+    if stats is not None and starts:
+        stats.sql_count += 1
+        stats.sql_time += time.perf_counter() - starts.pop()
+
+with app.app_context():
+    for engine in db.engines.values():
+        event.listen(engine, 'before_cursor_execute', before_sql_execute)
+        event.listen(engine, 'after_cursor_execute', after_sql_execute)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# 本进程的指标，多进程部署时每个 worker 各自统计
+# 进程是否还在运行；Windows 上 os.kill 会直接结束进程，而且只以单进程运行
+def process_alive(pid):
+    if os.name != 'posix':
+        return pid == os.getpid()
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+class MetricsRegistry:
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.requests = {}      # (method, endpoint, status) -> 请求数
+        self.latency = {}       # (method, endpoint) -> [各区间计数..., +Inf 区间计数, 总耗时]
+        self.sql = {}           # endpoint -> [语句数, 耗时]
+        self.rows = {}          # endpoint -> 读取的行数
+        self.bytes = {}         # endpoint -> 响应字节数
+        self.rejected = {}      # (endpoint, reason) -> 被限流或拒绝的请求数，没有开启指标时也统计
+        self.thread = None
+
+    @property
+    def buckets(self):
+        return self.app.config['METRICS_LATENCY_BUCKETS']
+
+    # 本进程计数的副本，结构和上面的各个字典相同
+    def state(self):
+        with self.lock:
+            return {
+                "requests": dict(self.requests),
+                "latency": {key: list(value) for key, value in self.latency.items()},
+                "sql": {key: list(value) for key, value in self.sql.items()},
+                "rows": dict(self.rows),
+                "bytes": dict(self.bytes),
+                "rejected": dict(self.rejected),
+            }
+
+    @staticmethod
+    def merge(total, state):
+        for name, values in state.items():
+            target = total.setdefault(name, {})
+            for key, value in values.items():
+                current = target.get(key)
+                if current is None:
+                    target[key] = value
+                elif isinstance(value, list):
+                    target[key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target[key] = current + value
+
+    def snapshot_path(self, pid):
+        return os.path.join(self.app.config['METRICS_SHARED_FOLDER'], f"{pid}.json")
+
+    # 先写临时文件再重命名，其他进程不会读到写了一半的文件；元组 key 转成列表保存
+    def write_snapshot(self):
+        state = {name: [[list(key) if isinstance(key, tuple) else key, value] for key, value in values.items()]
+                 for name, values in self.state().items()}
+        path = self.snapshot_path(os.getpid())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"in_flight": admission_control.in_flight, "state": state}, f)
+        os.replace(temp_path, path)
+
+    # 汇总所有进程写出的计数；已经退出的进程计数保留（计数器不能变小），并发请求数只算还在运行的进程
+    def shared_state(self):
+        self.write_snapshot()
+        total, in_flight = {}, 0
+        folder = self.app.config['METRICS_SHARED_FOLDER']
+        for filename in os.listdir(folder):
+            pid, ext = os.path.splitext(filename)
+            if ext != '.json' or not pid.isdigit():
+                continue
+            try:
+                with open(os.path.join(folder, filename), encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            state = {name: {tuple(key) if isinstance(key, list) else key: value for key, value in values}
+                     for name, values in snapshot["state"].items()}
+            self.merge(total, state)
+            if process_alive(int(pid)):
+                in_flight += snapshot["in_flight"]
+        return total, in_flight
+
+    # 删除上一次启动留下的计数文件，由 serve.py 的主进程在启动 worker 之前调用
+    def reset_shared(self):
+        folder = self.app.config['METRICS_SHARED_FOLDER']
+        if os.path.isdir(folder):
+            for name in os.listdir(folder):
+                os.remove(os.path.join(folder, name))
+
+    def start(self):
+        if self.thread is not None or not self.app.config['METRICS_SHARED']:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="metrics-snapshot", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.app.config['METRICS_SNAPSHOT_INTERVAL'])
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                print(f" * Failed to write metrics snapshot: {str(e)}")
+
+    def observe(self, method, endpoint, status, stats, elapsed):
+        self.start()
+        buckets = self.buckets
+        with self.lock:
+            key = (method, endpoint, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+            latency = self.latency.get((method, endpoint))
+            if latency is None:
+                latency = self.latency[(method, endpoint)] = [0] * (len(buckets) + 1) + [0.0]
+            latency[bisect.bisect_left(buckets, elapsed)] += 1
+            latency[-1] += elapsed
+
+            sql = self.sql.setdefault(endpoint, [0, 0.0])
+            sql[0] += stats.sql_count
+            sql[1] += stats.sql_time
+            self.rows[endpoint] = self.rows.get(endpoint, 0) + stats.rows
+            self.bytes[endpoint] = self.bytes.get(endpoint, 0) + stats.response_bytes
+
+    def reject(self, endpoint, reason):
+        self.start()
+        with self.lock:
+            key = (endpoint, reason)
+            self.rejected[key] = self.rejected.get(key, 0) + 1
+
+    # Prometheus 文本格式；开启 METRICS_SHARED 时为所有 worker 的合计
+    def render(self):
+        buckets = self.buckets
+        lines = []
+
+        def metric(name, metric_type, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        if self.app.config['METRICS_SHARED']:
+            state, in_flight = self.shared_state()
+        else:
+            state, in_flight = self.state(), admission_control.in_flight
+
+        metric("app_http_requests_total", "counter", "HTTP requests by method, endpoint and status.")
+        for (method, endpoint, status), count in sorted(state["requests"].items()):
+            lines.append(f'app_http_requests_total{{method="{method}",endpoint="{escape_label(endpoint)}",status="{status}"}} {count}')
+
+        metric("app_http_request_duration_seconds", "histogram", "Request latency including streamed bodies.")
+        for (method, endpoint), latency in sorted(state["latency"].items()):
+            labels = f'method="{method}",endpoint="{escape_label(endpoint)}"'
+            cumulative = 0
+            for bound, count in zip(buckets, latency):
+                cumulative += count
+                lines.append(f'app_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            cumulative += latency[len(buckets)]
+            lines.append(f'app_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f'app_http_request_duration_seconds_sum{{{labels}}} {latency[-1]:.6f}')
+            lines.append(f'app_http_request_duration_seconds_count{{{labels}}} {cumulative}')
+
+        metric("app_sql_statements_total", "counter", "SQL statements executed while handling requests.")
+        for endpoint, (count, _) in sorted(state["sql"].items()):
+            lines.append(f'app_sql_statements_total{{endpoint="{escape_label(endpoint)}"}} {count}')
+
+        metric("app_sql_duration_seconds_total", "counter", "Time spent executing SQL statements.")
+        for endpoint, (_, seconds) in sorted(state["sql"].items()):
+            lines.append(f'app_sql_duration_seconds_total{{endpoint="{escape_label(endpoint)}"}} {seconds:.6f}')
+
+        metric("app_db_rows_fetched_total", "counter", "Rows fetched from SQLite.")
+        for endpoint, count in sorted(state["rows"].items()):
+            lines.append(f'app_db_rows_fetched_total{{endpoint="{escape_label(endpoint)}"}} {count}')
+
+        metric("app_http_response_bytes_total", "counter", "Response body bytes sent.")
+        for endpoint, count in sorted(state["bytes"].items()):
+            lines.append(f'app_http_response_bytes_total{{endpoint="{escape_label(endpoint)}"}} {count}')
+
+        metric("app_http_rejected_total", "counter", "Requests rejected by rate limiting (429) or load shedding (503).")
+        for (endpoint, reason), count in sorted(state["rejected"].items()):
+            lines.append(f'app_http_rejected_total{{endpoint="{escape_label(endpoint)}",reason="{reason}"}} {count}')
+
+        metric("app_http_requests_in_flight", "gauge", "Requests currently being handled.")
+        lines.append(f"app_http_requests_in_flight {in_flight}")
+
+        return "\n".join(lines) + "\n"
+
+metrics_registry = MetricsRegistry(app)
+
+# 采样分析器：后台线程定时读取请求线程的调用栈，输出 collapsed stack 格式（可直接生成火焰图）
+class RequestSampler:
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='request-sampler', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self.samples[key] = self.samples.get(key, 0) + 1
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.samples.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+
+@app.before_request
+def start_request_metrics():
+    profile = app.config['PROFILER_ENABLED'] and request.headers.get('X-Profile') == '1'
+    if not (app.config['METRICS_ENABLED'] or profile):
+        metrics_local.stats = None
+        return
+
+    metrics_local.stats = RequestStats()
+    if profile:
+        g.profiler = RequestSampler(threading.get_ident(), app.config['PROFILER_INTERVAL'])
+        g.profiler.start()
+
+# 流式响应在发送过程中统计字节数
+def count_response_bytes(iterable, stats):
+    try:
+        for chunk in iterable:
+            stats.response_bytes += len(chunk)
+            yield chunk
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+
+# 流式响应在发送完毕后再记录，延迟和 SQL 统计都包含生成响应体的时间
+def finish_request_metrics(stats, method, endpoint, status, profiler, profile_path):
+    elapsed = time.perf_counter() - stats.start
+    metrics_local.stats = None
+
+    if profiler is not None:
+        profiler.stop()
+        profiler.dump(profile_path)
+
+    if app.config['METRICS_ENABLED']:
+        metrics_registry.observe(method, endpoint, status, stats, elapsed)
+
+@app.after_request
+def record_request_metrics(response):
+    stats = getattr(metrics_local, 'stats', None)
+    if stats is None:
+        return response
+
+    if response.content_length is not None:
+        stats.response_bytes = response.content_length
+    elif response.is_streamed and not response.direct_passthrough:
+        response.response = count_response_bytes(response.response, stats)
+
+    profiler = g.pop('profiler', None)
+    profile_path = None
+    if profiler is not None:
+        os.makedirs(app.config['PROFILE_FOLDER'], exist_ok=True)
+        profile_name = f"{datetime.now(ZoneInfo('Asia/Shanghai')).strftime('%Y%m%d%H%M%S')}-{request.endpoint}-{uuid.uuid4().hex[:8]}.txt"
+        profile_path = os.path.join(app.config['PROFILE_FOLDER'], profile_name)
+        response.headers['X-Profile-Dump'] = profile_name
+
+    finish = partial(finish_request_metrics, stats, request.method, request.endpoint or 'none',
+                     response.status_code, profiler, profile_path)
+    # send_file 之类 direct_passthrough 的响应由服务器直接发送文件对象，werkzeug 不会调用 call_on_close
+    # 注册的回调，这里直接结束统计（耗时不包含文件传输）
+    if response.is_streamed and not response.direct_passthrough:
+        response.call_on_close(finish)
+    else:
+        finish()
+    return response
+
+# 令牌桶的进程内实现：key -> (令牌数, 上次更新时间)
+class MemoryRateLimitBackend:
+    def __init__(self, max_keys=100000):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.max_keys = max_keys
+
+    # 取一个令牌，返回 (是否允许, 还要等多少秒才有令牌)
+    def acquire(self, key, capacity, rate):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.prune(now)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    # 调用方持有锁；空闲了一小时的桶早已补满，删除后和新建的桶没有区别
+    def prune(self, now):
+        self.buckets = {key: value for key, value in self.buckets.items() if now - value[1] < 3600}
+
+# 令牌桶的 SQLite 实现：一条 UPSERT 完成补充和扣减，多个进程之间计数一致
+class SQLiteRateLimitBackend:
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.calls = 0
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_bucket (key TEXT PRIMARY KEY, tokens REAL, updated REAL, allowed INTEGER)"
+            )
+            self.local.connection = connection
+        return connection
+
+    def acquire(self, key, capacity, rate):
+        now = time.time()
+        refilled = "MIN(:capacity, tokens + (:now - updated) * :rate)"
+        tokens, allowed = self.connection.execute(
+            "INSERT INTO rate_bucket (key, tokens, updated, allowed) VALUES (:key, :capacity - 1, :now, 1) "
+            f"ON CONFLICT (key) DO UPDATE SET "
+            f"tokens = CASE WHEN {refilled} >= 1 THEN {refilled} - 1 ELSE {refilled} END, "
+            f"allowed = {refilled} >= 1, updated = :now "
+            "RETURNING tokens, allowed",
+            {"key": key, "capacity": capacity, "rate": rate, "now": now}
+        ).fetchone()
+
+        self.calls += 1
+        if self.calls % 10000 == 0:
+            self.connection.execute("DELETE FROM rate_bucket WHERE updated < ?", (now - 3600,))
+        return bool(allowed), 0 if allowed else (1 - tokens) / rate
+
+def create_rate_limit_backend():
+    if app.config['RATE_LIMIT_BACKEND'] == 'sqlite':
+        return SQLiteRateLimitBackend(app.config['RATE_LIMIT_PATH'])
+    return MemoryRateLimitBackend()
+
+# 准入控制：先检查进程的并发上限（超过返回 503），再按接口的令牌桶限流（超过返回 429）
+# 两种拒绝都在执行接口之前返回，不占用数据库连接和 SQLite 写锁
+class AdmissionControl:
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.backend = None
+
+    def enter(self):
+        limit = self.app.config['MAX_CONCURRENT_REQUESTS']
+        with self.lock:
+            if limit is not None and self.in_flight >= limit:
+                return False
+            self.in_flight += 1
+        return True
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    # 登录用户按用户 ID 计数（只验签名，不查库），其余按 IP 计数
+    @staticmethod
+    def client_key():
+        token = request.headers.get('Authorization', '')
+        if token:
+            try:
+                payload = jwt.decode(token[7:] if token.startswith("Bearer ") else token,
+                                     app.config['SECRET_KEY'], algorithms=['HS256'])
+                return f"user:{payload['user_id']}"
+            except (jwt.InvalidTokenError, KeyError):
+                pass
+        return f"ip:{request.remote_addr}"
+
+    def check_rate_limit(self, endpoint):
+        limit = self.app.config['RATE_LIMITS'].get(endpoint)
+        if limit is None:
+            return True, 0
+        if self.backend is None:
+            self.backend = create_rate_limit_backend()
+        capacity, period = limit
+        return self.backend.acquire(f"{endpoint}:{self.client_key()}", capacity, capacity / period)
+
+admission_control = AdmissionControl(app)
+
+@app.before_request
+def admit_request():
+    endpoint = request.endpoint or 'none'
+    if endpoint == 'metrics':
+        return None
+
+    if not admission_control.enter():
+        metrics_registry.reject(endpoint, 'overload')
+        response = api_response(False, {"message": "Server is busy, please retry later"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    g.admitted = True
+
+    if app.config['RATE_LIMIT_ENABLED']:
+        allowed, retry_after = admission_control.check_rate_limit(endpoint)
+        if not allowed:
+            metrics_registry.reject(endpoint, 'rate_limit')
+            response = api_response(False, {"message": "Too many requests, please retry later"})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(math.ceil(retry_after))
+            return response
+
+@app.teardown_request
+def release_request_slot(error=None):
+    if g.pop('admitted', False):
+        admission_control.leave()
 
 # 加密解密 Token 的 Secret Key
 app.config['SECRET_KEY'] = 'AURLEMON'
 
+# 删除用户后是否复用其 ID（优先分配最小的空闲 ID）
+app.config['USER_ID_REUSE_GAPS'] = True
+
+# Token 校验模式：stateless 只验签名和 exp，再查内存中的吊销列表；database 每次请求都查 Token 表
+app.config['TOKEN_VERIFY_MODE'] = 'stateless'
+app.config['TOKEN_SWEEP_INTERVAL'] = 60     # 同步吊销列表的间隔（秒）
+app.config['TOKEN_PURGE_INTERVAL'] = 300    # 后台任务删除过期 Token 的间隔（秒）
+
+# 密码哈希：scrypt 或 pbkdf2_sha256（标准库没有 argon2）
+# 调整算法或参数后，旧的哈希和明文密码会在下次登录成功时重新计算
+app.config['PASSWORD_HASH_METHOD'] = 'scrypt'
+app.config['PASSWORD_SCRYPT_N'] = 2 ** 14
+app.config['PASSWORD_SCRYPT_R'] = 8
+app.config['PASSWORD_SCRYPT_P'] = 1
+app.config['PASSWORD_PBKDF2_ITERATIONS'] = 600000
+app.config['PASSWORD_HASH_WORKERS'] = 2         # 同时计算哈希的线程数，限制 KDF 占用的 CPU
+app.config['PASSWORD_HASH_MAX_PENDING'] = 64    # 排队中的哈希任务上限，超过时返回 503
+app.config['PASSWORD_HASH_BULK_WORKERS'] = 1    # 批量导入用户使用的哈希线程数，和登录/注册的线程池分开
+
 # 用户表模型
 class User(db.Model):
     id = db.Column(db.String(36), primary_key=True)                                         # 用户ID（UUID等）
@@ -72,6 +865,13 @@ class News(db.Model):
     details_content = db.Column(db.Text)                                                    # 详细内容
     view_count = db.Column(db.Integer, default=0)                                           # 查看次数
 
+    # 索引由 MIGRATIONS 统一创建到已有数据库，这里声明保证新建数据库时一致
+    __table_args__ = (
+        db.Index('ix_news_publish_date', 'publish_date'),
+        db.Index('ix_news_view_count', 'view_count'),
+        db.Index('ix_news_published_deleted_date', 'is_published', 'is_deleted', 'publish_date'),
+    )
+
     def __repr__(self):
         return f"<News {self.title}>"
 
@@ -84,9 +884,42 @@ class File(db.Model):
     file_type = db.Column(db.String(50), nullable=False)                                    # 文件类型
     upload_date = db.Column(db.DateTime, default=datetime.now(ZoneInfo('Asia/Shanghai')))   # 上传时间
 
+    sha256 = db.Column(db.String(64))                                                        # 文件内容的 SHA-256
+
+    __table_args__ = (
+        db.Index('ix_file_upload_date', 'upload_date'),
+        db.Index('ix_file_stored_filename', 'stored_filename'),
+        db.Index('ix_file_sha256', 'sha256'),
+    )
+
     def __repr__(self):
         return f"<File {self.original_filename}>"
 
+# 文件内容表模型（按 SHA-256 存储的文件内容及引用它的 File 记录数）
+class FileBlob(db.Model):
+    sha256 = db.Column(db.String(64), primary_key=True)                                     # 文件内容的 SHA-256
+    size = db.Column(db.Integer, nullable=False)                                            # 文件大小
+    ref_count = db.Column(db.Integer, nullable=False, default=0)                            # 引用计数
+
+    def __repr__(self):
+        return f"<FileBlob {self.sha256} x{self.ref_count}>"
+
+# 分片上传会话表模型（tus 风格，按 offset 续传）
+class UploadSession(db.Model):
+    id = db.Column(db.String(36), primary_key=True)                                         # 会话ID（UUID）
+    original_filename = db.Column(db.String(200), nullable=False)                           # 原始文件名
+    file_type = db.Column(db.String(50), nullable=False)                                    # 文件类型
+    length = db.Column(db.Integer)                                                          # 文件总大小，未知时为空
+    offset = db.Column(db.Integer, nullable=False, default=0)                               # 已接收的字节数
+    updated_at = db.Column(db.DateTime, nullable=False)                                     # 最后写入时间
+
+    __table_args__ = (
+        db.Index('ix_upload_session_updated_at', 'updated_at'),
+    )
+
+    def __repr__(self):
+        return f"<UploadSession {self.id} {self.offset}/{self.length}>"
+
 # Token 表模型    
 class Token(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -94,8 +927,22 @@ class Token(db.Model):
     token = db.Column(db.String(512), unique=True, nullable=False)                          # 存储的Token
     expiration = db.Column(db.DateTime, nullable=False)                                     # Token过期时间
 
+    __table_args__ = (
+        db.Index('ix_token_expiration', 'expiration'),
+        db.Index('ix_token_user_id', 'user_id'),
+    )
+
     def __repr__(self):
         return f"<Token {self.token}>"
+
+# 已吊销 Token 表模型（未过期就被作废的 Token，供各进程同步内存中的吊销列表）
+class RevokedToken(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)                      # Token 的 SHA-256
+    expiration = db.Column(db.DateTime, nullable=False)                                     # 原 Token 过期时间
+
+    def __repr__(self):
+        return f"<RevokedToken {self.token_hash}>"
     
 # TestData 表模型
 class TestData(db.Model):
@@ -105,32 +952,653 @@ class TestData(db.Model):
     def __repr__(self):
         return f"<TestData {self.content}>"
 
+# ID 序列表模型（用户 ID 等字符串主键的自增计数器）
+class IdSequence(db.Model):
+    name = db.Column(db.String(50), primary_key=True)                                       # 序列名称
+    next_value = db.Column(db.Integer, nullable=False)                                      # 下一个可分配的值
+
+    def __repr__(self):
+        return f"<IdSequence {self.name}={self.next_value}>"
+
+# 空闲 ID 表模型（删除后可以复用的 ID）
+class IdFreeList(db.Model):
+    name = db.Column(db.String(50), primary_key=True)                                       # 序列名称
+    value = db.Column(db.Integer, primary_key=True)                                         # 空闲的值
+
+    def __repr__(self):
+        return f"<IdFreeList {self.name}:{self.value}>"
+
+# 后台任务表模型（本地持久化的任务队列）
+class Task(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)                                        # 任务名称
+    payload = db.Column(db.Text, nullable=False, default='{}')                              # 参数（JSON）
+    status = db.Column(db.String(20), nullable=False, default='queued')                     # queued / running / done / failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)                             # 已执行次数
+    max_attempts = db.Column(db.Integer, nullable=False)                                    # 最多执行次数
+    run_at = db.Column(db.DateTime, nullable=False)                                         # 最早执行时间
+    unique_key = db.Column(db.String(200))                                                  # 去重键，同一个键同时只有一个未完成的任务
+    locked_by = db.Column(db.String(100))                                                   # 执行中的 worker
+    locked_until = db.Column(db.DateTime)                                                   # 租约到期时间，过期视为 worker 已退出
+    last_error = db.Column(db.Text)                                                         # 最近一次失败的原因
+    created_at = db.Column(db.DateTime, nullable=False)                                     # 创建时间
+    finished_at = db.Column(db.DateTime)                                                    # 完成或最终失败的时间
+
+    __table_args__ = (
+        db.Index('ix_task_status_run_at', 'status', 'run_at'),
+        db.Index('ix_task_unique_key', 'unique_key', unique=True,
+                 sqlite_where=text("status IN ('queued', 'running')")),
+    )
+
+    def __repr__(self):
+        return f"<Task {self.id} {self.name} {self.status}>"
+
+# 数据库迁移：把 upload 目录下按 UUID 存储的旧文件搬进内容寻址存储，重复内容只保留一份
+# 旧记录的 stored_filename 不变，原来的下载链接继续可用
+def migrate_upload_folder_to_blobs():
+    for file in File.query.filter(File.sha256.is_(None) | (File.sha256 == '')).all():
+        legacy_path = os.path.join(app.config['UPLOAD_FOLDER'], file.stored_filename)
+        if os.path.isfile(legacy_path):
+            file.sha256 = hash_file(legacy_path)
+
+    for file in File.query.filter(File.sha256.isnot(None)).all():
+        legacy_path = os.path.join(app.config['UPLOAD_FOLDER'], file.stored_filename)
+        if os.path.isfile(legacy_path):
+            store_blob(legacy_path, file.sha256, os.path.getsize(legacy_path))
+        elif os.path.isfile(blob_path(file.sha256)):
+            store_blob(None, file.sha256, os.path.getsize(blob_path(file.sha256)))
+
+# 新闻全文索引：外部内容 FTS5 表，由触发器在 news 增删改时增量同步
+NEWS_FTS_TRIGGERS = [
+    "CREATE TRIGGER news_fts_after_insert AFTER INSERT ON news BEGIN "
+    "INSERT INTO news_fts (rowid, title, content, details_content) "
+    "VALUES (new.id, new.title, new.content, new.details_content); END",
+    "CREATE TRIGGER news_fts_after_delete AFTER DELETE ON news BEGIN "
+    "INSERT INTO news_fts (news_fts, rowid, title, content, details_content) "
+    "VALUES ('delete', old.id, old.title, old.content, old.details_content); END",
+    "CREATE TRIGGER news_fts_after_update AFTER UPDATE OF title, content, details_content ON news BEGIN "
+    "INSERT INTO news_fts (news_fts, rowid, title, content, details_content) "
+    "VALUES ('delete', old.id, old.title, old.content, old.details_content); "
+    "INSERT INTO news_fts (rowid, title, content, details_content) "
+    "VALUES (new.id, new.title, new.content, new.details_content); END",
+]
+
+# 重建新闻全文索引（同时按当前配置的分词器重新建表）
+def rebuild_news_search_index():
+    for trigger in ("news_fts_after_insert", "news_fts_after_delete", "news_fts_after_update"):
+        db.session.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    db.session.execute(text("DROP TABLE IF EXISTS news_fts"))
+    db.session.execute(text(
+        "CREATE VIRTUAL TABLE news_fts USING fts5(title, content, details_content, "
+        f"content='news', content_rowid='id', tokenize='{app.config['NEWS_SEARCH_TOKENIZER']}')"
+    ))
+    for trigger in NEWS_FTS_TRIGGERS:
+        db.session.execute(text(trigger))
+    db.session.execute(text("INSERT INTO news_fts (news_fts) VALUES ('rebuild')"))
+
+# 数据库迁移：新增列（新数据库由 create_all 按模型建好，所以要先检查列是否已经存在）
+def add_column_if_missing(table, column, column_type):
+    def migrate():
+        columns = [row[1] for row in db.session.execute(text(f"PRAGMA table_info({table})"))]
+        if column not in columns:
+            db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+    return migrate
+
+# 早期手工导入的数据把布尔值存成了 'true'/'false' 文本，GET /api/news 按 0/1 过滤时会漏掉这些行，
+# SQLAlchemy 也会把 'false' 读成 True；只更新文本值，可以重复执行
+def normalize_boolean_columns():
+    for table, column in (("news", "is_published"), ("news", "is_deleted"), ("user", "is_admin")):
+        db.session.execute(text(
+            f"UPDATE {table} SET {column} = CASE lower({column}) WHEN 'true' THEN 1 ELSE 0 END "
+            f"WHERE typeof({column}) = 'text'"
+        ))
+
+# 数据库迁移：已执行到的版本号记录在 PRAGMA user_version 中，按版本号顺序执行
+# 每一步是一条 SQL 或一个函数
+MIGRATIONS = [
+    (1, "Add indexes for news, token and file access paths", [
+        normalize_boolean_columns,
+        "CREATE INDEX IF NOT EXISTS ix_news_publish_date ON news (publish_date)",
+        "CREATE INDEX IF NOT EXISTS ix_news_view_count ON news (view_count)",
+        "CREATE INDEX IF NOT EXISTS ix_news_published_deleted_date ON news (is_published, is_deleted, publish_date)",
+        "CREATE INDEX IF NOT EXISTS ix_token_expiration ON token (expiration)",
+        "CREATE INDEX IF NOT EXISTS ix_token_user_id ON token (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_file_upload_date ON file (upload_date)",
+    ]),
+    # 已有的纯数字用户 ID 接着往下分配，中间的空缺放进空闲列表；非数字 ID 保持不变
+    (2, "Seed user id sequence and free list from existing user ids", [
+        "INSERT OR IGNORE INTO id_sequence (name, next_value) "
+        "SELECT 'user', COALESCE(MAX(CAST(id AS INTEGER)), 0) + 1 FROM user "
+        "WHERE id != '' AND id NOT GLOB '*[^0-9]*'",
+        "INSERT OR IGNORE INTO id_free_list (name, value) "
+        "WITH RECURSIVE seq(n) AS ("
+        "SELECT 1 UNION ALL SELECT n + 1 FROM seq "
+        "WHERE n < (SELECT next_value - 1 FROM id_sequence WHERE name = 'user')) "
+        "SELECT 'user', n FROM seq WHERE CAST(n AS TEXT) NOT IN (SELECT id FROM user)",
+    ]),
+    (3, "Add file.sha256", [
+        add_column_if_missing("file", "sha256", "VARCHAR(64)"),
+    ]),
+    (4, "Move uploads into the content-addressed blob store", [
+        "CREATE INDEX IF NOT EXISTS ix_file_stored_filename ON file (stored_filename)",
+        "CREATE INDEX IF NOT EXISTS ix_file_sha256 ON file (sha256)",
+        migrate_upload_folder_to_blobs,
+    ]),
+    (5, "Create the news full-text search index", [
+        rebuild_news_search_index,
+    ]),
+    # 迁移 1 加上布尔值修正之前已经执行过迁移 1 的数据库在这里补上
+    (6, "Normalize boolean columns stored as text", [
+        normalize_boolean_columns,
+    ]),
+    # 迁移 2 在没有用户时也会把 1 放进空闲列表，之后会和序列分配出的 1 重复；
+    # 删掉不小于序列下一个值或已经被占用的空闲 ID
+    (7, "Remove stray entries from the user id free list", [
+        "DELETE FROM id_free_list WHERE name = 'user' AND ("
+        "value >= (SELECT next_value FROM id_sequence WHERE name = 'user') "
+        "OR CAST(value AS TEXT) IN (SELECT id FROM user))",
+    ]),
+]
+
+# 各接口实际执行的查询，迁移前后对比 EXPLAIN QUERY PLAN
+ENDPOINT_QUERIES = [
+    ("GET /api/news", "SELECT id, publish_date, title FROM news ORDER BY publish_date DESC, id DESC LIMIT 21"),
+    ("GET /api/news?is_published=1&is_deleted=0", "SELECT id, publish_date, title FROM news "
+        "WHERE is_published = 1 AND is_deleted = 0 ORDER BY publish_date DESC, id DESC LIMIT 21"),
+    ("GET /api/news/hot (hot)", "SELECT id, view_count FROM news WHERE view_count > 0"),
+    ("GET /api/news/hot (recent)", "SELECT id, title FROM news ORDER BY publish_date DESC, id DESC LIMIT 3"),
+    ("GET /api/news/<id>", "SELECT * FROM news WHERE id = 1"),
+    ("POST /api/login", "SELECT * FROM user WHERE username = 'admin'"),
+    ("verify_token (database)", "SELECT * FROM token WHERE token = ''"),
+    ("revoke_user_tokens", "SELECT * FROM token WHERE user_id = '1'"),
+    ("token sweeper", "SELECT id FROM token WHERE expiration < '2000-01-01 00:00:00'"),
+    ("GET /api/upload/list", "SELECT * FROM file ORDER BY upload_date DESC"),
+]
+
+def explain_endpoint_queries():
+    plans = {}
+    for endpoint, sql in ENDPOINT_QUERIES:
+        rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+        plans[endpoint] = "; ".join(row[-1] for row in rows)
+    return plans
+
+def print_query_plans(before, after):
+    for endpoint, plan in after.items():
+        print(f"   [{endpoint}]")
+        print(f"     before: {before.get(endpoint)}")
+        print(f"     after:  {plan}")
+
+# 执行未应用的迁移，并输出每个接口查询在迁移前后的执行计划
+def run_migrations(report=False):
+    current_version = db.session.execute(text("PRAGMA user_version")).scalar()
+    pending = [migration for migration in MIGRATIONS if migration[0] > current_version]
+
+    if not pending:
+        print(f" * Database schema is up to date (version {current_version})")
+        if report:
+            plans = explain_endpoint_queries()
+            print_query_plans(plans, plans)
+        return
+
+    before = explain_endpoint_queries()
+
+    for version, description, statements in pending:
+        print(f" * Applying migration {version}: {description}")
+        for statement in statements:
+            if callable(statement):
+                statement()
+            else:
+                db.session.execute(text(statement))
+        db.session.execute(text(f"PRAGMA user_version = {int(version)}"))
+        db.session.commit()
+
+    after = explain_endpoint_queries()
+    print(" * Query plans before and after migration:")
+    print_query_plans(before, after)
+
 # 自动创建数据库和表
 def create_tables():
     print(" * Creating all tables...")
     with app.app_context():
         db.create_all()
+        run_migrations()
     print(" * Tables created!")
 
+# 命令行：flask --app app migrate
+@app.cli.command("migrate")
+def migrate_command():
+    with app.app_context():
+        db.create_all()
+        run_migrations(report=True)
+
+# 命令行：flask --app app rebuild-search-index
+@app.cli.command("rebuild-search-index")
+def rebuild_search_index_command():
+    with app.app_context():
+        rebuild_news_search_index()
+        db.session.commit()
+        count = db.session.execute(text("SELECT COUNT(*) FROM news")).scalar()
+    print(f" * Rebuilt news search index ({count} articles)")
+
+SHANGHAI_TZ = ZoneInfo('Asia/Shanghai')
+
+# 响应里的 time 字段精确到秒，同一秒内的请求复用同一个字符串
+response_time_cache = (0, '')
+
+def response_time():
+    global response_time_cache
+    now = int(time.time())
+    if response_time_cache[0] != now:
+        response_time_cache = (now, datetime.fromtimestamp(now, SHANGHAI_TZ).strftime('%Y-%m-%d %H:%M:%S'))
+    return response_time_cache[1]
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+# 序列化为 UTF-8 字节
+def json_dumps(value):
+    backend = app.config['JSON_ENCODER_BACKEND']
+    if orjson is not None and backend in ('auto', 'orjson'):
+        return orjson.dumps(value, default=json_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(value, default=json_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+def json_loads(value):
+    if orjson is not None and app.config['JSON_ENCODER_BACKEND'] in ('auto', 'orjson'):
+        return orjson.loads(value)
+    return json.loads(value)
+
+def json_response(payload, status=200):
+    return app.response_class(json_dumps(payload), status=status, mimetype='application/json')
+
 # API 响应格式化函数
 def api_response(is_success, data=None):
     status = 'success' if is_success else 'error'
-    time = datetime.now(ZoneInfo('Asia/Shanghai')).strftime('%Y-%m-%d %H:%M:%S')
     
     response = {
         'status': status,
-        'time': time,
+        'time': response_time(),
         'data': data
     }
     
-    return jsonify(response)
+    return json_response(response)
+
+# 逐行流式输出 api_response 格式的 JSON 数组，内存占用和行数无关
+def api_response_stream(names, rows, with_time=True):
+    def generate():
+        if with_time:
+            yield b'{"status":"success","time":' + json_dumps(response_time()) + b',"data":['
+        else:
+            yield b'{"status":"success","data":['
+        separator = b''
+        for row in rows:
+            yield separator + json_dumps(dict(zip(names, row)))
+            separator = b','
+        yield b']}'
+
+    return app.response_class(stream_with_context(generate()), mimetype='application/json')
+
+# 日期列在 SQL 里直接截取数据库中的文本到秒，和 strftime('%Y-%m-%d %H:%M:%S') 结果一致，不必逐行解析
+def formatted_datetime(column):
+    return func.substr(type_coerce(column, db.String), 1, 19)
+
+# 按 (字段名, 列) 只查询需要的列，返回元组而不是 ORM 对象
+def list_query(columns):
+    return db.session.query(*[column.label(name) for name, column in columns])
+
+# 查询列表数据；请求带 stream=1 时流式输出
+def list_response(columns, query=None):
+    names = [name for name, _ in columns]
+    query = query if query is not None else list_query(columns)
+
+    if request.args.get('stream') == '1':
+        return api_response_stream(names, query.yield_per(app.config['JSON_STREAM_BATCH_SIZE']))
+
+    return api_response(True, [dict(zip(names, row)) for row in query])
+
+NDJSON_MIMETYPES = {'application/x-ndjson', 'application/ndjson', 'application/jsonl'}
+
+# 读取批量写入的请求体：JSON 数组（或 {"items": [...]}），或每行一个 JSON 对象的 NDJSON
+# NDJSON 里解析失败的行以 ValueError 占位，记为该条失败，不影响其他行
+def read_bulk_items(max_items=None):
+    max_items = max_items or app.config['BULK_MAX_ITEMS']
+
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = []
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            if len(items) >= max_items:
+                raise ValueError(f"Too many items: at most {max_items} per request")
+            try:
+                items.append(json_loads(line))
+            except ValueError:
+                items.append(ValueError("Invalid JSON"))
+        return items
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('items')
+    if not isinstance(data, list):
+        raise ValueError("Request body must be a JSON array or NDJSON")
+    if len(data) > max_items:
+        raise ValueError(f"Too many items: at most {max_items} per request")
+    return data
+
+# 批量写入的布尔字段只接受 true/false、0/1 或不传（默认 false），字符串 "false" 不会被当成 True
+def parse_bulk_bool(data, name):
+    value = data.get(name)
+    if value is None:
+        return False, None
+    if isinstance(value, bool) or (isinstance(value, int) and value in (0, 1)):
+        return bool(value), None
+    return None, f"Field {name} must be a boolean"
+
+# 先逐条校验全部记录，再把通过的记录按 BULK_BATCH_SIZE 分批交给 insert_batch，最后统一提交
+# validate(item) 返回 (要插入的行, 错误信息)；insert_batch(rows) 返回与 rows 对应的 (新 ID, 错误信息) 列表
+# prepare(rows) 在任何写入之前对所有通过校验的行执行一次，用于密码哈希这类耗时的计算，避免在持有写锁时进行
+def bulk_write(items, validate, insert_batch, prepare=None):
+    results = [None] * len(items)
+    batch_size = app.config['BULK_BATCH_SIZE']
+
+    valid = []
+    for index, item in enumerate(items):
+        if isinstance(item, ValueError):
+            row, error = None, str(item)
+        elif not isinstance(item, dict):
+            row, error = None, "Item must be a JSON object"
+        else:
+            row, error = validate(item)
+
+        if error:
+            results[index] = {"index": index, "status": "error", "message": error}
+        else:
+            valid.append((index, row))
+
+    if prepare is not None and valid:
+        prepare([row for _, row in valid])
+
+    for start in range(0, len(valid), batch_size):
+        batch = valid[start:start + batch_size]
+        inserted = insert_batch([row for _, row in batch])
+        for (index, _), (new_id, error) in zip(batch, inserted):
+            if error:
+                results[index] = {"index": index, "status": "error", "message": error}
+            else:
+                results[index] = {"index": index, "status": "created", "id": new_id}
+
+    db.session.commit()
+    return results
+
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+# 解析导出的时间范围参数，支持日期或精确到秒的时间
+def parse_export_time(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid {name}: expected YYYY-MM-DD or YYYY-MM-DD HH:MM:SS")
+
+# 流式导出 NDJSON / CSV，内存占用只和一批的大小有关
+# 参数：format=ndjson|csv，fields=逗号分隔的列，since/until=按 date_column 过滤的时间范围（含 since，不含 until）
+# 数据库里的时间是文本，和同样格式的参数按字符串比较，可以用上 date_column 的索引
+def export_response(name, columns, date_column, id_column):
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return api_response(False, {"message": "Invalid format: must be ndjson or csv"})
+
+    fields_arg = request.args.get('fields')
+    fields = [f.strip() for f in fields_arg.split(',') if f.strip()] if fields_arg else list(columns)
+    unknown_fields = set(fields) - set(columns)
+    if unknown_fields:
+        return api_response(False, {"message": f"Unknown fields: {', '.join(sorted(unknown_fields))}"})
+
+    try:
+        since = parse_export_time('since')
+        until = parse_export_time('until')
+    except ValueError as ve:
+        return api_response(False, {"message": str(ve)})
+
+    date_raw = type_coerce(date_column, db.String)
+    query = list_query([(field, columns[field]) for field in fields])
+    if since:
+        query = query.filter(date_raw >= since)
+    if until:
+        query = query.filter(date_raw < until)
+    rows = query.order_by(date_column, id_column).yield_per(app.config['EXPORT_BATCH_SIZE'])
+
+    chunk_bytes = app.config['EXPORT_CHUNK_BYTES']
+
+    def generate_ndjson():
+        chunk = bytearray()
+        for row in rows:
+            chunk += json_dumps(dict(zip(fields, row)))
+            chunk += b'\n'
+            if len(chunk) >= chunk_bytes:
+                yield bytes(chunk)
+                chunk.clear()
+        if chunk:
+            yield bytes(chunk)
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= chunk_bytes:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+
+    generate = generate_csv if fmt == 'csv' else generate_ndjson
+    response = app.response_class(stream_with_context(generate()), mimetype=EXPORT_FORMATS[fmt])
+    filename = f"{name}-{datetime.now(SHANGHAI_TZ).strftime('%Y%m%d%H%M%S')}.{fmt}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def bulk_response(message, results):
+    created = sum(1 for result in results if result["status"] == "created")
+    return api_response(True, {
+        "message": message,
+        "created": created,
+        "failed": len(results) - created,
+        "results": results
+    })
+
+# 分配新的用户 ID：优先取空闲列表中最小的值，否则从序列中原子地取下一个值
+# 在调用方的事务里执行，和插入用户一起提交，多个进程并发注册时由 SQLite 的写锁串行化
+def allocate_user_id():
+    while True:
+        new_id = None
+
+        if app.config['USER_ID_REUSE_GAPS']:
+            new_id = db.session.execute(text(
+                "DELETE FROM id_free_list WHERE name = 'user' AND value = "
+                "(SELECT MIN(value) FROM id_free_list WHERE name = 'user') RETURNING value"
+            )).scalar()
+
+        if new_id is None:
+            new_id = db.session.execute(text(
+                "UPDATE id_sequence SET next_value = next_value + 1 WHERE name = 'user' RETURNING next_value - 1"
+            )).scalar()
+
+        if new_id is None:
+            raise RuntimeError("User id sequence is not initialized, run migrations first")
+
+        # 跳过被手动插入占用的 ID
+        if not db.session.get(User, str(new_id)):
+            return str(new_id)
+
+# 批量分配 count 个用户 ID：空闲列表和序列各执行一条语句，不逐个分配
+def allocate_user_ids(count):
+    ids = []
+
+    while len(ids) < count:
+        needed = count - len(ids)
+        candidates = []
+
+        if app.config['USER_ID_REUSE_GAPS']:
+            candidates = db.session.execute(text(
+                "DELETE FROM id_free_list WHERE name = 'user' AND value IN "
+                "(SELECT value FROM id_free_list WHERE name = 'user' "
+                "AND value < (SELECT next_value FROM id_sequence WHERE name = 'user') "
+                "ORDER BY value LIMIT :count) RETURNING value"
+            ), {"count": needed}).scalars().all()
+
+        if len(candidates) < needed:
+            remaining = needed - len(candidates)
+            end = db.session.execute(text(
+                "UPDATE id_sequence SET next_value = next_value + :count WHERE name = 'user' RETURNING next_value"
+            ), {"count": remaining}).scalar()
+            if end is None:
+                raise RuntimeError("User id sequence is not initialized, run migrations first")
+            candidates += range(end - remaining, end)
+
+        # 空闲列表只取序列已经分配过的范围，不会和本次从序列分配的 ID 重复；这里再跳过被手动插入占用的 ID
+        candidates = [str(value) for value in sorted(set(candidates))]
+        occupied = {user_id for user_id, in db.session.query(User.id).filter(User.id.in_(candidates))}
+        ids += [user_id for user_id in candidates if user_id not in occupied]
+
+    return ids
+
+# 回收被删除用户的 ID
+def release_user_id(user_id):
+    if app.config['USER_ID_REUSE_GAPS'] and user_id.isdigit():
+        db.session.execute(
+            text("INSERT OR IGNORE INTO id_free_list (name, value) VALUES ('user', :value)"),
+            {"value": int(user_id)}
+        )
+
+class PasswordHasherBusy(Exception):
+    pass
+
+# 密码哈希在有界线程池里计算，请求线程只等待结果；hashlib 的 KDF 计算期间会释放 GIL
+# 存储格式：scrypt$n$r$p$salt$hash 或 pbkdf2_sha256$iterations$salt$hash，salt 和 hash 为 base64
+class PasswordHasher:
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pending = None
+        self.bulk_executor = None
+        self.bulk_lock = threading.Lock()   # 同时只处理一批批量导入
+
+    def start(self):
+        if self.executor is None:
+            with self.lock:
+                if self.executor is None:
+                    self.pending = threading.BoundedSemaphore(self.app.config['PASSWORD_HASH_MAX_PENDING'])
+                    self.executor = ThreadPoolExecutor(max_workers=self.app.config['PASSWORD_HASH_WORKERS'],
+                                                       thread_name_prefix='password-hasher')
+        return self.executor
+
+    def current_params(self):
+        config = self.app.config
+        if config['PASSWORD_HASH_METHOD'] == 'pbkdf2_sha256':
+            return 'pbkdf2_sha256', (config['PASSWORD_PBKDF2_ITERATIONS'],)
+        return 'scrypt', (config['PASSWORD_SCRYPT_N'], config['PASSWORD_SCRYPT_R'], config['PASSWORD_SCRYPT_P'])
+
+    @staticmethod
+    def derive(method, params, password, salt):
+        if method == 'pbkdf2_sha256':
+            return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, params[0])
+        n, r, p = params
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p + 1024 * 1024, dklen=32)
+
+    @staticmethod
+    def b64encode(value):
+        return base64.b64encode(value).decode().rstrip('=')
+
+    @staticmethod
+    def b64decode(value):
+        return base64.b64decode(value + '=' * (-len(value) % 4))
+
+    def encode(self, password):
+        method, params = self.current_params()
+        salt = os.urandom(16)
+        digest = self.derive(method, params, password, salt)
+        return '$'.join([method, *map(str, params), self.b64encode(salt), self.b64encode(digest)])
+
+    # 返回 (密码是否正确, 是否需要按当前参数重新哈希)
+    def check(self, stored, password):
+        parts = stored.split('$')
+        try:
+            if parts[0] == 'scrypt' and len(parts) == 6:
+                method, params = 'scrypt', tuple(int(value) for value in parts[1:4])
+            elif parts[0] == 'pbkdf2_sha256' and len(parts) == 4:
+                method, params = 'pbkdf2_sha256', (int(parts[1]),)
+            else:
+                method = None
+        except ValueError:
+            method = None
+
+        # 旧数据里的明文密码
+        if method is None:
+            return hmac.compare_digest(stored.encode(), password.encode()), True
+
+        salt, expected = self.b64decode(parts[-2]), self.b64decode(parts[-1])
+        valid = hmac.compare_digest(self.derive(method, params, password, salt), expected)
+        return valid, (method, params) != self.current_params()
+
+    def run(self, func, *args):
+        executor = self.start()
+        if not self.pending.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            return executor.submit(func, *args).result()
+        finally:
+            self.pending.release()
+
+    def hash(self, password):
+        return self.run(self.encode, password)
+
+    def verify(self, stored, password):
+        return self.run(self.check, stored, password)
+
+    def start_bulk(self):
+        if self.bulk_executor is None:
+            with self.lock:
+                if self.bulk_executor is None:
+                    self.bulk_executor = ThreadPoolExecutor(max_workers=self.app.config['PASSWORD_HASH_BULK_WORKERS'],
+                                                            thread_name_prefix='password-hasher-bulk')
+        return self.bulk_executor
+
+    # 批量导入使用单独的线程池，登录、注册不会排在整批导入后面；
+    # 已经有一批在计算时直接返回 503，不在线程池里无限排队
+    def hash_many(self, passwords):
+        executor = self.start_bulk()
+        if not self.bulk_lock.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            return list(executor.map(self.encode, passwords))
+        finally:
+            self.bulk_lock.release()
+
+password_hasher = PasswordHasher(app)
+
+@app.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(error):
+    return api_response(False, {"message": "Server is busy, please retry later"}), 503
 
 # 生成 Token
 def generate_token(user):
     payload = {
         'user_id': user.id,
         'is_admin': user.is_admin,
-        'exp': datetime.now(ZoneInfo('Asia/Shanghai')) + timedelta(hours=1)
+        'exp': datetime.now(ZoneInfo('Asia/Shanghai')) + timedelta(hours=1),
+        'jti': uuid.uuid4().hex     # 同一秒内多次登录时保证 Token 唯一
     }
     
     token = jwt.encode(payload, app.config['SECRET_KEY'], algorithm='HS256')
@@ -141,6 +1609,90 @@ def generate_token(user):
     
     return token
 
+# Token 的 SHA-256 摘要，吊销表和内存吊销列表都只存摘要
+def hash_token(raw_token):
+    return hashlib.sha256(raw_token.encode()).hexdigest()
+
+# 当前上海时间（去掉时区，和数据库中存储的 DateTime 保持一致）
+def shanghai_now_naive():
+    return datetime.now(ZoneInfo('Asia/Shanghai')).replace(tzinfo=None)
+
+# 内存中的 Token 吊销列表，后台线程定期从 RevokedToken 表同步，并批量清理过期的 Token
+class TokenRevocationCache:
+    def __init__(self, app):
+        self.app = app
+        self.revoked = set()
+        self.local = {}     # 本进程吊销、尚未在同步结果中出现的摘要 -> 过期时间
+        self.lock = threading.Lock()
+        self.start_lock = threading.Lock()
+        self.ready = threading.Event()
+        self.thread = None
+
+    # 摘要截取前 16 字节存放，节省内存
+    @staticmethod
+    def key(token_hash):
+        return bytes.fromhex(token_hash)[:16]
+
+    def is_revoked(self, raw_token):
+        return self.key(hash_token(raw_token)) in self.revoked
+
+    def add(self, token_hash, expiration):
+        with self.lock:
+            self.local[token_hash] = expiration
+            self.revoked.add(self.key(token_hash))
+
+    # 重新加载未过期的吊销记录；过期的 Token 和吊销记录由后台任务 purge_expired_tokens 删除
+    def sweep(self):
+        now = shanghai_now_naive()
+        with self.app.app_context():
+            loaded = {token_hash for (token_hash,) in
+                      db.session.query(RevokedToken.token_hash).filter(RevokedToken.expiration >= now)}
+
+        with self.lock:
+            self.local = {h: exp for h, exp in self.local.items() if h not in loaded and exp >= now}
+            self.revoked = {self.key(h) for h in loaded} | {self.key(h) for h in self.local}
+
+    # 第一次调用时同步加载一次吊销记录，加载完成前其他请求在这里等待；
+    # 加载失败时抛出异常（请求返回 500），不会用空的吊销列表放行已吊销的 Token
+    def start(self):
+        if self.ready.is_set():
+            return
+        with self.start_lock:
+            if self.ready.is_set():
+                return
+            self.sweep()
+            self.ready.set()
+            self.thread = threading.Thread(target=self.run, name="token-sweeper", daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.app.config['TOKEN_SWEEP_INTERVAL'])
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f" * Token sweep failed: {str(e)}")
+
+token_revocations = TokenRevocationCache(app)
+
+# 吊销某个用户的全部 Token（删除用户、变更管理员权限时调用）
+def revoke_user_tokens(user_id):
+    now = shanghai_now_naive()
+    tokens = Token.query.filter_by(user_id=user_id).all()
+    revoked = []
+
+    for token_entry in tokens:
+        if token_entry.expiration >= now:
+            token_hash = hash_token(token_entry.token)
+            db.session.add(RevokedToken(token_hash=token_hash, expiration=token_entry.expiration))
+            revoked.append((token_hash, token_entry.expiration))
+        db.session.delete(token_entry)
+
+    db.session.commit()
+
+    for token_hash, expiration in revoked:
+        token_revocations.add(token_hash, expiration)
+
 # 验证 Token    
 def verify_token(raw_token):
     def get_token_from_header(raw_token):
@@ -149,6 +1701,22 @@ def verify_token(raw_token):
         return raw_token
     
     raw_token = get_token_from_header(raw_token)
+
+    # 无状态验证依赖吊销列表，第一次验证前先同步加载；之后由后台线程定期重新加载
+    token_revocations.start()
+
+    if app.config['TOKEN_VERIFY_MODE'] == 'stateless':
+        try:
+            payload = jwt.decode(raw_token, app.config['SECRET_KEY'], algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            return {"message": "Token expired"}, 401
+        except jwt.InvalidTokenError:
+            return {"message": "Invalid token"}, 400
+
+        if token_revocations.is_revoked(raw_token):
+            return {"message": "Token revoked"}, 401
+
+        return payload
     
     try:
         token_entry = db.session.query(Token).filter_by(token=raw_token).first()
@@ -176,32 +1744,782 @@ def verify_token(raw_token):
     except jwt.InvalidTokenError:
         return {"message": "Invalid token"}, 400
 
+# 新闻浏览量累加器：请求中只在内存里计数，由后台线程批量写回数据库
+class ViewCounter:
+    def __init__(self, app):
+        self.app = app
+        self.pending = {}
+        self.pending_total = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    # 记一次浏览，首次调用时启动写回线程
+    def increment(self, news_id, amount=1):
+        with self.lock:
+            self.pending[news_id] = self.pending.get(news_id, 0) + amount
+            self.pending_total += amount
+            should_flush = self.pending_total >= self.app.config['VIEW_COUNT_FLUSH_THRESHOLD']
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="view-count-flusher", daemon=True)
+                self.thread.start()
+
+        if should_flush:
+            self.wakeup.set()
+
+    # 尚未写回数据库的浏览次数
+    def get_pending(self, news_id):
+        with self.lock:
+            return self.pending.get(news_id, 0)
+
+    def get_all_pending(self):
+        with self.lock:
+            return dict(self.pending)
+
+    # 用一条 executemany 的 UPDATE 把累计值写回，失败时把计数放回去等下次重试
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending, self.pending_total = self.pending, {}, 0
+
+            if not batch:
+                return 0
+
+            try:
+                with self.app.app_context():
+                    db.session.execute(
+                        text("UPDATE news SET view_count = COALESCE(view_count, 0) + :delta WHERE id = :id"),
+                        [{"id": news_id, "delta": delta} for news_id, delta in batch.items()]
+                    )
+                    db.session.commit()
+            except Exception as e:
+                with self.lock:
+                    for news_id, delta in batch.items():
+                        self.pending[news_id] = self.pending.get(news_id, 0) + delta
+                        self.pending_total += delta
+                print(f" * View count flush failed: {str(e)}")
+                return 0
+
+            return len(batch)
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.app.config['VIEW_COUNT_FLUSH_INTERVAL'])
+            self.wakeup.clear()
+            self.flush()
+
+view_counter = ViewCounter(app)
+
+# 进程退出时写回剩余的浏览量
+atexit.register(view_counter.flush)
+
+# 后台任务队列：任务存在 SQLite 的 task 表里，不依赖外部消息队列
+# thread：每个 Web 进程里启动一个 worker 线程；external：只由 flask --app app worker 启动的进程执行
+app.config['TASK_QUEUE_MODE'] = 'thread'
+app.config['TASK_POLL_INTERVAL'] = 1            # 没有任务时的轮询间隔（秒）
+app.config['TASK_LEASE_SECONDS'] = 300          # 任务执行超过该时间视为 worker 已退出，重新排队
+app.config['TASK_MAX_ATTEMPTS'] = 5
+app.config['TASK_RETRY_BACKOFF'] = 5            # 第 n 次失败后等待 TASK_RETRY_BACKOFF * 2^(n-1) 秒再重试
+app.config['TASK_RETRY_BACKOFF_MAX'] = 3600
+app.config['TASK_RETENTION'] = 7 * 24 * 3600    # 已完成和最终失败的任务保留多久（秒）
+
+# 任务名称 -> (函数, 最多执行次数, 周期任务的间隔秒数或配置项名称)
+task_registry = {}
+
+# 注册后台任务，函数在应用上下文中执行，参数为入队时的 payload 字典
+# interval 为秒数或配置项名称时作为周期任务，由 worker 启动时安排第一次执行
+def background_task(name, max_attempts=None, interval=None):
+    def decorator(func):
+        task_registry[name] = (func, max_attempts, interval)
+        return func
+    return decorator
+
+def task_interval(name):
+    interval = task_registry[name][2]
+    return app.config[interval] if isinstance(interval, str) else interval
+
+# 把任务加入队列；只写入当前会话，和请求中的其他修改一起提交，请求回滚时任务也不会执行
+# unique_key 相同的未完成任务已经存在时忽略
+def enqueue_task(name, payload=None, delay=0, unique_key=None):
+    if name not in task_registry:
+        raise KeyError(f"Unknown task: {name}")
+
+    now = shanghai_now_naive()
+    max_attempts = task_registry[name][1] or app.config['TASK_MAX_ATTEMPTS']
+    db.session.execute(insert(Task).prefix_with('OR IGNORE').values(
+        name=name,
+        payload=json_dumps(payload or {}).decode(),
+        status='queued',
+        attempts=0,
+        max_attempts=max_attempts,
+        run_at=now + timedelta(seconds=delay),
+        unique_key=unique_key,
+        created_at=now
+    ))
+
+def schedule_periodic_tasks():
+    for name, (_, _, interval) in task_registry.items():
+        if interval is not None:
+            enqueue_task(name, unique_key=f"periodic:{name}")
+    db.session.commit()
+
+class TaskWorker:
+    def __init__(self, app, worker_id=None):
+        self.app = app
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.stopping = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    # 领取一个到期的任务：UPDATE ... RETURNING 在 SQLite 的写锁下执行，多个 worker 不会领到同一个任务
+    def claim(self):
+        now = shanghai_now_naive()
+        lease = now + timedelta(seconds=self.app.config['TASK_LEASE_SECONDS'])
+
+        # 租约过期的任务说明执行它的 worker 已经退出，重新排队
+        db.session.execute(update(Task).where(Task.status == 'running', Task.locked_until < now)
+                           .values(status='queued', locked_by=None, locked_until=None)
+                           .execution_options(synchronize_session=False))
+
+        next_task = (select(Task.id).where(Task.status == 'queued', Task.run_at <= now)
+                     .order_by(Task.run_at, Task.id).limit(1).scalar_subquery())
+        row = db.session.execute(
+            update(Task).where(Task.id == next_task, Task.status == 'queued')
+            .values(status='running', attempts=Task.attempts + 1, locked_by=self.worker_id, locked_until=lease)
+            .returning(Task.id, Task.name, Task.payload, Task.attempts, Task.max_attempts, Task.unique_key)
+            .execution_options(synchronize_session=False)
+        ).first()
+        db.session.commit()
+        return row
+
+    def retry_delay(self, attempts):
+        delay = min(self.app.config['TASK_RETRY_BACKOFF'] * 2 ** (attempts - 1), self.app.config['TASK_RETRY_BACKOFF_MAX'])
+        # 加一点随机抖动，避免同时失败的任务同时重试
+        return delay * random.uniform(0.5, 1.0)
+
+    def finish(self, row, error=None):
+        now = shanghai_now_naive()
+        values = {'locked_by': None, 'locked_until': None}
+        if error is None:
+            values.update(status='done', finished_at=now, last_error=None)
+        elif row.attempts < row.max_attempts:
+            values.update(status='queued', run_at=now + timedelta(seconds=self.retry_delay(row.attempts)), last_error=error)
+        else:
+            values.update(status='failed', finished_at=now, last_error=error)
+
+        db.session.execute(update(Task).where(Task.id == row.id, Task.locked_by == self.worker_id).values(**values)
+                           .execution_options(synchronize_session=False))
+
+        # 周期任务完成或最终失败后安排下一次执行
+        if values['status'] != 'queued' and row.unique_key == f"periodic:{row.name}" and row.name in task_registry:
+            enqueue_task(row.name, delay=task_interval(row.name), unique_key=row.unique_key)
+        db.session.commit()
+
+    # 执行一个到期的任务，没有任务时返回 False
+    def run_once(self):
+        with self.app.app_context():
+            row = self.claim()
+            if row is None:
+                return False
+
+            entry = task_registry.get(row.name)
+            try:
+                if entry is None:
+                    raise KeyError(f"Unknown task: {row.name}")
+                entry[0](json_loads(row.payload))
+                error = None
+            except Exception as e:
+                db.session.rollback()
+                error = f"{type(e).__name__}: {e}"
+                print(f" * Task {row.id} {row.name} failed (attempt {row.attempts}/{row.max_attempts}): {error}",
+                      file=sys.stderr)
+
+            self.finish(row, error)
+            return True
+
+    def run(self):
+        with self.app.app_context():
+            schedule_periodic_tasks()
+
+        while not self.stopping.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                print(f" * Task worker error: {str(e)}", file=sys.stderr)
+            self.stopping.wait(self.app.config['TASK_POLL_INTERVAL'])
+
+    # thread 模式下在 Web 进程里启动 worker 线程
+    def start(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="task-worker", daemon=True)
+                self.thread.start()
+
+    # 等正在执行的任务完成后停止
+    def stop(self, timeout=None):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+task_worker = TaskWorker(app)
+
+@app.before_request
+def start_task_worker():
+    if app.config['TASK_QUEUE_MODE'] == 'thread':
+        task_worker.start()
+
+# 后台任务：删除过期的 Token 和吊销记录
+@background_task("purge_expired_tokens", interval='TOKEN_PURGE_INTERVAL')
+def purge_expired_tokens(payload):
+    now = shanghai_now_naive()
+    Token.query.filter(Token.expiration < now).delete(synchronize_session=False)
+    RevokedToken.query.filter(RevokedToken.expiration < now).delete(synchronize_session=False)
+    db.session.commit()
+
+# 后台任务：删除保留期已过的任务记录
+@background_task("purge_finished_tasks", interval=3600)
+def purge_finished_tasks(payload):
+    deadline = shanghai_now_naive() - timedelta(seconds=app.config['TASK_RETENTION'])
+    Task.query.filter(Task.status.in_(('done', 'failed')), Task.finished_at < deadline).delete(synchronize_session=False)
+    db.session.commit()
+
+# 命令行：flask --app app worker [--processes N] [--once]
+@app.cli.command("worker")
+@click.option('--processes', default=1, show_default=True, help="Number of worker processes.")
+@click.option('--once', is_flag=True, help="Run the tasks that are due, then exit.")
+def worker_command(processes, once):
+    with app.app_context():
+        db.create_all()
+
+    if once:
+        schedule_periodic_tasks()
+        count = 0
+        while task_worker.run_once():
+            count += 1
+        shutdown_app()
+        print(f" * Ran {count} tasks")
+        return
+
+    if processes > 1:
+        run_worker_processes(processes)
+        return
+
+    # SIGTERM / Ctrl+C：执行完当前任务后退出
+    signal.signal(signal.SIGTERM, lambda signum, frame: task_worker.stopping.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: task_worker.stopping.set())
+    print(f" * Task worker {task_worker.worker_id} started", flush=True)
+    try:
+        task_worker.run()
+    finally:
+        shutdown_app()
+        print(f" * Task worker {task_worker.worker_id} stopped", flush=True)
+
+# 多进程：每个子进程是独立的 flask worker，主进程转发退出信号，子进程异常退出时重新启动
+def run_worker_processes(processes):
+    command = [sys.executable, '-m', 'flask', '--app', os.path.abspath(__file__), 'worker']
+    children = [subprocess.Popen(command) for _ in range(processes)]
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while not stopping:
+        for index, child in enumerate(children):
+            if child.poll() is not None:
+                print(f" * Task worker process {child.pid} exited with code {child.returncode}, restarting", flush=True)
+                children[index] = subprocess.Popen(command)
+        time.sleep(1)
+
+    for child in children:
+        if child.poll() is None:
+            child.terminate()
+    for child in children:
+        child.wait()
+
+# 命令行：flask --app app tasks，按名称和状态统计任务数
+@app.cli.command("tasks")
+def tasks_command():
+    with app.app_context():
+        rows = db.session.execute(select(Task.name, Task.status, func.count()).group_by(Task.name, Task.status)
+                                  .order_by(Task.name, Task.status)).all()
+    for name, status, count in rows:
+        print(f" {name:<32} {status:<8} {count}")
+
+# 新闻排行榜：在内存里增量维护按衰减热度和按发布时间排序的前 N 条
+# 热度按指数衰减累加：每次浏览加 e^(λ(t - t0))，比较大小时不必对所有分数重新衰减
+# 首次加载时没有浏览时间记录，用累计浏览量作为初始热度，之后随时间衰减
+class NewsLeaderboard:
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.next_sync = 0.0
+        self.scores = {}        # 新闻 ID -> 热度（以 t0 为基准）
+        self.counted = {}       # 新闻 ID -> 已计入热度的浏览次数（本进程的浏览 + 同步时读到的数据库增量）
+        self.meta = {}          # 新闻 ID -> 返回给前端的字段
+        self.hot = []           # 热度前 N 的新闻 ID，按热度降序
+        self.recent = []        # 最新发布的 N 条，元素为 (publish_date, id)，降序
+        self.t0 = time.time()
+
+    @property
+    def limit(self):
+        return self.app.config['HOT_NEWS_LIMIT']
+
+    @property
+    def decay_rate(self):
+        return math.log(2) / self.app.config['HOT_NEWS_HALF_LIFE']
+
+    @staticmethod
+    def news_meta(news, author_name, view_count=None):
+        return {
+            "id": news.id,
+            "title": news.title,
+            "author": news.author,
+            "author_name": author_name,
+            "publish_date": news.publish_date.strftime('%Y-%m-%d %H:%M:%S'),
+            "view_count": news.view_count if view_count is None else view_count
+        }
+
+    # 第一次访问时从数据库加载初始数据，之后每隔 HOT_NEWS_SYNC_INTERVAL 秒和数据库对齐一次
+    def load(self):
+        if self.loaded and time.monotonic() < self.next_sync:
+            return
+        with self.lock:
+            if not self.loaded:
+                self.t0 = time.time()
+                self.counted = dict(db.session.query(News.id, News.view_count).filter(News.view_count > 0))
+                self.scores = {news_id: float(view_count) for news_id, view_count in self.counted.items()}
+                self.hot = heapq.nlargest(self.limit, self.scores, key=self.scores.get)
+                self.reload_recent()
+                self.fill_meta(self.hot)
+                self.loaded = True
+            elif time.monotonic() >= self.next_sync:
+                self.sync()
+            self.next_sync = time.monotonic() + self.app.config['HOT_NEWS_SYNC_INTERVAL']
+
+    # 多进程部署时其他 worker 的新增、删除、修改和浏览不会通知到本进程：
+    # 去掉数据库里已经不存在的新闻，把数据库 view_count 比已计入次数多出的部分（其他 worker 写回的浏览）
+    # 按同步时刻加进热度，各 worker 的排行因此趋于一致；最后重新读取最新发布的 N 条和展示字段
+    def sync(self):
+        view_counts = dict(db.session.query(News.id, News.view_count))
+        # 先读数据库再读待写回的计数：两次读取之间写回的浏览两边都看不到，只会少算，下次同步补上；反过来会重复计入
+        pending = view_counter.get_all_pending()
+        now = time.time()
+        if self.decay_rate * (now - self.t0) > 50:
+            self.rebase(now)
+        weight = math.exp(self.decay_rate * (now - self.t0))
+        self.scores = {news_id: score for news_id, score in self.scores.items() if news_id in view_counts}
+        self.counted = {news_id: count for news_id, count in self.counted.items() if news_id in view_counts}
+        for news_id, view_count in view_counts.items():
+            delta = (view_count or 0) + pending.get(news_id, 0) - self.counted.get(news_id, 0)
+            if delta > 0:
+                self.scores[news_id] = self.scores.get(news_id, 0.0) + delta * weight
+                self.counted[news_id] = self.counted.get(news_id, 0) + delta
+        self.hot = heapq.nlargest(self.limit, self.scores, key=self.scores.get)
+        self.meta = {}
+        self.reload_recent()
+        self.fill_meta(self.hot)
+
+    def reload_recent(self):
+        rows = (db.session.query(News, NEWS_AUTHOR_NAME)
+                .order_by(News.publish_date.desc(), News.id.desc()).limit(self.limit).all())
+        self.recent = [(news.publish_date, news.id) for news, _ in rows]
+        for news, author_name in rows:
+            self.meta[news.id] = self.news_meta(news, author_name)
+
+    # 补齐排行榜里缺少展示字段的新闻
+    def fill_meta(self, news_ids):
+        missing = [news_id for news_id in news_ids if news_id not in self.meta]
+        if missing:
+            for news, author_name in db.session.query(News, NEWS_AUTHOR_NAME).filter(News.id.in_(missing)):
+                self.meta[news.id] = self.news_meta(news, author_name)
+
+    # 基准时间离现在太远时重新归一化，避免 e^x 溢出
+    def rebase(self, now):
+        factor = math.exp(-self.decay_rate * (now - self.t0))
+        self.scores = {news_id: score * factor for news_id, score in self.scores.items()}
+        self.t0 = now
+
+    def record_view(self, news, author_name, view_count):
+        self.load()
+        now = time.time()
+        with self.lock:
+            if self.decay_rate * (now - self.t0) > 50:
+                self.rebase(now)
+
+            score = self.scores.get(news.id, 0.0) + math.exp(self.decay_rate * (now - self.t0))
+            self.scores[news.id] = score
+            self.counted[news.id] = self.counted.get(news.id, 0) + 1
+
+            if news.id in self.hot or news.id in self.meta:
+                self.meta[news.id] = self.news_meta(news, author_name, view_count)
+
+            # 其他新闻的分数没有变化，只需要看这一条能否进入前 N
+            if news.id in self.hot:
+                self.hot.sort(key=self.scores.get, reverse=True)
+            elif len(self.hot) < self.limit or score > self.scores[self.hot[-1]]:
+                self.meta[news.id] = self.news_meta(news, author_name, view_count)
+                self.hot = sorted(self.hot + [news.id], key=self.scores.get, reverse=True)[:self.limit]
+
+    def add_news(self, news, author_name):
+        self.load()
+        with self.lock:
+            key = (news.publish_date, news.id)
+            self.meta[news.id] = self.news_meta(news, author_name)
+            self.recent = sorted(self.recent + [key], reverse=True)[:self.limit]
+
+    # 批量新增新闻后重新读取最新发布的 N 条
+    def refresh_recent(self):
+        self.load()
+        with self.lock:
+            self.reload_recent()
+
+    # 用户改名或被删除后更新排行榜里该用户新闻的作者名
+    def rename_author(self, user_id, author_name):
+        with self.lock:
+            for meta in self.meta.values():
+                if meta["author"] == user_id:
+                    meta["author_name"] = author_name
+
+    def remove_news(self, news_id):
+        self.load()
+        with self.lock:
+            self.scores.pop(news_id, None)
+            self.counted.pop(news_id, None)
+            self.meta.pop(news_id, None)
+            if news_id in self.hot:
+                self.hot = heapq.nlargest(self.limit, self.scores, key=self.scores.get)
+                self.fill_meta(self.hot)
+            if any(recent_id == news_id for _, recent_id in self.recent):
+                self.reload_recent()
+
+    def get(self, limit=None):
+        self.load()
+        limit = self.limit if limit is None else min(limit, self.limit)
+        now = time.time()
+        with self.lock:
+            decay = math.exp(-self.decay_rate * (now - self.t0))
+            daily_hots = [dict(self.meta[news_id], hot_score=round(self.scores[news_id] * decay, 2))
+                          for news_id in self.hot[:limit]]
+            recent_release = [self.meta[news_id] for _, news_id in self.recent[:limit]]
+        return daily_hots, recent_release
+
+news_leaderboard = NewsLeaderboard(app)
+
+# 响应缓存：进程内 LRU，按总字节数和 TTL 淘汰，按表名打标签失效
+class MemoryCacheBackend:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()    # key -> (过期时间, 标签, 缓存内容)
+        self.tags = {}                  # 标签 -> key 集合
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self.remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key, value, tags, ttl):
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (time.time() + ttl, tags, value)
+            self.size += len(value["body"])
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while self.size > self.max_bytes and self.entries:
+                self.remove(next(iter(self.entries)))
+
+    def invalidate(self, tags):
+        with self.lock:
+            for tag in tags:
+                for key in list(self.tags.get(tag, ())):
+                    self.remove(key)
+
+    # 调用方持有锁
+    def remove(self, key):
+        _, tags, value = self.entries.pop(key)
+        self.size -= len(value["body"])
+        for tag in tags:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+# 响应缓存：单独的 SQLite 文件，同一台机器上的多个进程共享，一个进程写入后其他进程的缓存同时失效
+# 超过大小上限时按写入时间淘汰（读取时不更新访问时间，避免每次命中都要写库）
+class SQLiteCacheBackend:
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entry (key TEXT PRIMARY KEY, status INTEGER, "
+                "content_type TEXT, etag TEXT, body BLOB, size INTEGER, expires REAL, created REAL)"
+            )
+            connection.execute("CREATE TABLE IF NOT EXISTS cache_tag (tag TEXT, key TEXT, PRIMARY KEY (tag, key))")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_cache_entry_created ON cache_entry (created)")
+            self.local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = self.connection.execute(
+            "SELECT status, content_type, etag, body, expires FROM cache_entry WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[4] < time.time():
+            return None
+        return {"status": row[0], "content_type": row[1], "etag": row[2], "body": row[3]}
+
+    def set(self, key, value, tags, ttl):
+        connection = self.connection
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache_entry VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, value["status"], value["content_type"], value["etag"], value["body"],
+                 len(value["body"]), now + ttl, now)
+            )
+            connection.executemany("INSERT OR IGNORE INTO cache_tag VALUES (?, ?)", [(tag, key) for tag in tags])
+            connection.execute("DELETE FROM cache_entry WHERE expires < ?", (now,))
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entry").fetchone()[0]
+            if total > self.max_bytes:
+                connection.execute(
+                    "DELETE FROM cache_entry WHERE key IN (SELECT key FROM cache_entry ORDER BY created "
+                    "LIMIT (SELECT COUNT(*) / 2 + 1 FROM cache_entry))"
+                )
+            connection.execute("DELETE FROM cache_tag WHERE key NOT IN (SELECT key FROM cache_entry)")
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def invalidate(self, tags):
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for tag in tags:
+                connection.execute(
+                    "DELETE FROM cache_entry WHERE key IN (SELECT key FROM cache_tag WHERE tag = ?)", (tag,)
+                )
+                connection.execute("DELETE FROM cache_tag WHERE tag = ?", (tag,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+def create_response_cache_backend():
+    backend = app.config['RESPONSE_CACHE_BACKEND']
+    if backend == 'memory':
+        return MemoryCacheBackend(app.config['RESPONSE_CACHE_MAX_BYTES'])
+    if backend == 'sqlite':
+        return SQLiteCacheBackend(app.config['RESPONSE_CACHE_PATH'], app.config['RESPONSE_CACHE_MAX_BYTES'])
+    return None
+
+response_cache = create_response_cache_backend()
+
+# 缓存 GET 接口的响应，key 为路径加排序后的查询参数，tags 为接口读取的表
+# 命中时直接返回缓存的响应体；请求带 If-None-Match 且 ETag 一致时返回 304
+def cached_response(*tags):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if response_cache is None or request.method != 'GET':
+                return func(*args, **kwargs)
+
+            # 参数值需要 URL 编码，否则 ?a=1&b=2 和 ?a=1%26b%3D2 会得到同一个 key
+            key = request.path + '?' + urlencode(sorted(request.args.items(multi=True)))
+            cached = response_cache.get(key)
+            cache_status = 'HIT'
+
+            if cached is None:
+                cache_status = 'MISS'
+                response = make_response(func(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                cached = {
+                    "status": response.status_code,
+                    "content_type": response.content_type,
+                    "etag": hashlib.sha1(body).hexdigest(),
+                    "body": body
+                }
+                if len(body) <= app.config['RESPONSE_CACHE_MAX_ENTRY_BYTES']:
+                    response_cache.set(key, cached, tags, app.config['RESPONSE_CACHE_TTL'])
+
+            response = app.response_class(cached["body"], status=cached["status"], content_type=cached["content_type"])
+            response.set_etag(cached["etag"])
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['X-Cache'] = cache_status
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+# 写接口提交之后调用，使读取了这些表的缓存失效
+def invalidate_cache(*tags):
+    if response_cache is not None:
+        response_cache.invalidate(tags)
+
+# 可用的压缩算法（gzip 由标准库 zlib 提供）
+compressors = {'gzip'} | ({'br'} if brotli is not None else set()) | ({'zstd'} if zstandard is not None else set())
+
+def compress_bytes(encoding, data, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)    # wbits=31 输出 gzip 格式
+    return compressor.compress(data) + compressor.flush()
+
+# 流式压缩，返回 (压缩一块并立即输出, 结束时输出剩余数据)，客户端可以边收边解压
+def stream_compressor(encoding, level):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        return lambda chunk: compressor.process(chunk) + compressor.flush(), compressor.finish
+    if encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        return lambda chunk: compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK), compressor.flush
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+def compress_stream(iterable, encoding, level):
+    compress_chunk, finish = stream_compressor(encoding, level)
+    try:
+        for chunk in iterable:
+            data = compress_chunk(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+
+# 按服务端的优先级选出客户端接受的编码，都不接受时返回 None
+def negotiate_encoding(available):
+    accepted = dict(request.accept_encodings)
+    for encoding in app.config['COMPRESSION_ALGORITHMS']:
+        if encoding in available and accepted.get(encoding, 0) > 0:
+            return encoding
+    return None
+
+# 带强 ETag 的响应（命中响应缓存的接口）内容相同，压缩结果按 (ETag, 编码) 缓存，命中时不必重新压缩
+compressed_bodies = OrderedDict()
+compressed_bodies_lock = threading.Lock()
+COMPRESSED_BODIES_MAX_ENTRIES = 256
+
+def compress_body(etag, encoding, data, level):
+    if etag is None:
+        return compress_bytes(encoding, data, level)
+
+    key = (etag, encoding)
+    with compressed_bodies_lock:
+        body = compressed_bodies.get(key)
+        if body is not None:
+            compressed_bodies.move_to_end(key)
+            return body
+
+    body = compress_bytes(encoding, data, level)
+    with compressed_bodies_lock:
+        compressed_bodies[key] = body
+        while len(compressed_bodies) > COMPRESSED_BODIES_MAX_ENTRIES:
+            compressed_bodies.popitem(last=False)
+    return body
+
+# 压缩 JSON、CSV 等文本响应；文件下载（direct_passthrough）不在这里压缩，静态文件使用预先压缩好的文件
+@app.after_request
+def compress_response(response):
+    if not app.config['COMPRESSION_ENABLED'] or request.method == 'HEAD':
+        return response
+    if (response.status_code < 200 or response.status_code in (204, 206, 304) or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    if not response.is_streamed and (response.content_length or 0) < app.config['COMPRESSION_MIN_SIZE']:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(compressors)
+    if encoding is None:
+        return response
+
+    level = app.config['COMPRESSION_LEVELS'][encoding]
+    etag, weak = response.get_etag()
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        response.set_data(compress_body(None if weak else etag, encoding, response.get_data(), level))
+    response.headers['Content-Encoding'] = encoding
+
+    # 压缩后的字节不同，改成弱 ETag；If-None-Match 按弱比较，仍能命中 304
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
+
 # API：查找测试数据 (GET)
 @app.route("/api/data", methods=["GET"])
+@read_only
+@cached_response('test_data')
 def get_test_data():
-    test_data = TestData.query.all()
-    data = [{"id": item.id, "content": item.content} for item in test_data]
-    
-    return jsonify({
+    names = ["id", "content"]
+    rows = db.session.query(TestData.id, TestData.content)
+
+    if request.args.get('stream') == '1':
+        return api_response_stream(names, rows.yield_per(app.config['JSON_STREAM_BATCH_SIZE']), with_time=False)
+
+    return json_response({
         "status": "success",
-        "data": data
-    }), 200
+        "data": [dict(zip(names, row)) for row in rows]
+    }, 200)
+
+def validate_test_data(data):
+    content = data.get("content")
+
+    if not content or not isinstance(content, str) or len(content) > 512:
+        return None, "Invalid content: must be non-empty and <= 512 characters"
+
+    return {"content": content}, None
 
 # API：传输数据 (POST)
 @app.route("/api/data", methods=["POST"])
 def post_test_data():
     data = request.get_json()
-    content = data.get("content")
+    row, error = validate_test_data(data)
 
-    if not content or len(content) > 512:
+    if error:
         return jsonify({
             "status": "error",
-            "message": "Invalid content: must be non-empty and <= 512 characters"
+            "message": error
         }), 400
-    
+
+    content = row["content"]
     new_test_data = TestData(content=content)
     db.session.add(new_test_data)
     db.session.commit()
+    invalidate_cache('test_data')
 
     return jsonify({
         "status": "success",
@@ -209,6 +2527,23 @@ def post_test_data():
         "data": {"id": new_test_data.id, "content": new_test_data.content}
     }), 201
 
+def insert_test_data_batch(rows):
+    ids = db.session.execute(insert(TestData).returning(TestData.id, sort_by_parameter_order=True), rows).scalars()
+    return [(new_id, None) for new_id in ids]
+
+# API：批量传输数据 (POST)
+@app.route("/api/data/bulk", methods=["POST"])
+def post_test_data_bulk():
+    try:
+        items = read_bulk_items()
+    except ValueError as ve:
+        return api_response(False, {"message": str(ve)})
+
+    results = bulk_write(items, validate_test_data, insert_test_data_batch)
+    invalidate_cache('test_data')
+
+    return bulk_response("TestData imported", results)
+
 # API：登录
 @app.route("/api/login", methods=["POST"])
 def login():
@@ -216,17 +2551,28 @@ def login():
     username = data.get('username')
     password = data.get('password')
 
+    if not isinstance(password, str):
+        return api_response(False, {"message": "Invalid username or password"})
+
     user = User.query.filter_by(username=username).first()
+    if not user:
+        return api_response(False, {"message": "Invalid username or password"})
 
-    if not user or user.password != password:
+    valid, needs_rehash = password_hasher.verify(user.password, password)
+    if not valid:
         return api_response(False, {"message": "Invalid username or password"})
 
+    # 明文或旧参数的哈希在登录成功时升级，和 Token 一起提交
+    if needs_rehash:
+        user.password = password_hasher.hash(password)
+
     token = generate_token(user)
     
     return api_response(True, {"token": token})
 
 # API：获取用户信息
 @app.route("/api/user/info", methods=["GET"])
+@read_only
 def get_user_info():
     token = request.headers.get('Authorization')
     
@@ -287,31 +2633,36 @@ def change_password():
     data = request.get_json()
     new_password = data.get('new_password')
 
-    user.password = new_password
+    if not new_password or not isinstance(new_password, str):
+        return api_response(False, {"message": "Missing required field: new_password"})
+
+    user.password = password_hasher.hash(new_password)
     db.session.commit()
 
     return api_response(True, {"message": "Password updated successfully"})
 
+USER_LIST_COLUMNS = [
+    ("id", User.id),
+    ("first_name", User.first_name),
+    ("last_name", User.last_name),
+    ("username", User.username),
+    ("reg_date", formatted_datetime(User.reg_date)),
+    ("apply_status", User.apply_status),
+    ("is_admin", User.is_admin),
+]
+
 # API：查看所有用户
 @app.route("/api/users", methods=["GET"])
+@read_only
+@cached_response('user')
 def get_users():
-    users = User.query.all()
-    user_data = []
-    for user in users:
-        formatted_reg_date = user.reg_date.strftime('%Y-%m-%d %H:%M:%S')
+    return list_response(USER_LIST_COLUMNS)
 
-        user_info = {
-            "id": user.id,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "username": user.username,
-            "reg_date": formatted_reg_date,
-            "apply_status": user.apply_status,
-            "is_admin": user.is_admin
-        }
-        user_data.append(user_info)
-
-    return api_response(True, user_data)
+# API：导出用户（不包含密码）
+@app.route("/api/users/export", methods=["GET"])
+@read_only
+def export_users():
+    return export_response("users", dict(USER_LIST_COLUMNS), User.reg_date, User.id)
 
 # API：编辑用户信息
 @app.route("/api/user/<string:id>", methods=["PUT"])
@@ -342,6 +2693,10 @@ def update_user(id):
     apply_status = data.get('apply_status', user.apply_status)
     is_admin = data.get('is_admin', user.is_admin)
     
+    # 管理员权限写在 Token 里，变更后需要吊销该用户已签发的 Token
+    is_admin_changed = bool(is_admin) != bool(user.is_admin)
+    username_changed = username != user.username
+
     user.first_name = first_name
     user.last_name = last_name
     user.username = username
@@ -350,6 +2705,15 @@ def update_user(id):
     
     db.session.commit()
 
+    if is_admin_changed:
+        revoke_user_tokens(user.id)
+
+    # 新闻列表的作者名来自 user 表，缓存按 user 标签一起失效
+    if username_changed:
+        news_leaderboard.rename_author(user.id, user.username)
+
+    invalidate_cache('user')
+
     return api_response(True, {"message": "User updated successfully", "user_info": {
         "id": user.id,
         "first_name": user.first_name,
@@ -380,11 +2744,62 @@ def delete_user(id):
     if not user:
         return api_response(False, {"message": "User not found"})
     
+    revoke_user_tokens(user.id)
+
     db.session.delete(user)
+    release_user_id(id)
     db.session.commit()
+    news_leaderboard.rename_author(id, None)
+    invalidate_cache('user')
 
     return api_response(True, {"message": "User deleted successfully"})
 
+USER_REQUIRED_FIELDS = ('first_name', 'last_name', 'username', 'password')
+
+def validate_user(data):
+    if not all(data.get(field) for field in USER_REQUIRED_FIELDS):
+        return None, "Missing required fields: first_name, last_name, username, password"
+    if not all(isinstance(data[field], str) for field in USER_REQUIRED_FIELDS):
+        return None, "Fields first_name, last_name, username, password must be strings"
+
+    flags = {}
+    for field in ('apply_status', 'is_admin'):
+        flags[field], error = parse_bulk_bool(data, field)
+        if error:
+            return None, error
+
+    return {
+        "first_name": data['first_name'],
+        "last_name": data['last_name'],
+        "username": data['username'],
+        "password": data['password'],
+        **flags
+    }, None
+
+# 在写入任何一批之前计算全部密码哈希，前面批次未提交的插入不会在 KDF 计算期间占着写锁
+def hash_user_passwords(rows):
+    for row, password_hash in zip(rows, password_hasher.hash_many([row["password"] for row in rows])):
+        row["password"] = password_hash
+
+# 用户名在库里或同一请求中已存在的记为失败，其余批量分配 ID 后插入
+def insert_user_batch(rows):
+    usernames = [row["username"] for row in rows]
+    taken = {username for username, in db.session.query(User.username).filter(User.username.in_(usernames))}
+
+    new_rows = []
+    for row in rows:
+        if row["username"] not in taken:
+            taken.add(row["username"])
+            new_rows.append(row)
+
+    for row, new_id in zip(new_rows, allocate_user_ids(len(new_rows))):
+        row["id"] = new_id
+
+    if new_rows:
+        db.session.execute(insert(User), new_rows)
+
+    return [(row["id"], None) if "id" in row else (None, "Username already exists") for row in rows]
+
 # API：新增用户
 @app.route("/api/user/add", methods=["POST"])
 def add_user():
@@ -403,22 +2818,24 @@ def add_user():
     existing_user = User.query.filter_by(username=username).first()
     if existing_user:
         return api_response(False, {"message": "Username already exists"})
-    
-    existing_ids = [int(user.id) for user in User.query.all() if user.id.isdigit()]
-    new_id = str(min(set(range(1, max(existing_ids) + 2)) - set(existing_ids))) if existing_ids else '1'
+
+    # 先计算哈希再分配 ID：分配 ID 会开启 SQLite 写事务，KDF 计算期间不能占着写锁
+    password_hash = password_hasher.hash(password)
+    new_id = allocate_user_id()
 
     new_user = User(
         id=new_id,
         first_name=first_name,
         last_name=last_name,
         username=username,
-        password=password,
+        password=password_hash,
         apply_status=apply_status,
         is_admin=is_admin
     )
 
     db.session.add(new_user)
     db.session.commit()
+    invalidate_cache('user')
 
     return api_response(True, {"message": "User added successfully", "user_info": {
         "id": new_id,
@@ -429,6 +2846,19 @@ def add_user():
         "is_admin": is_admin
     }})
 
+# API：批量新增用户
+@app.route("/api/users/bulk", methods=["POST"])
+def add_users_bulk():
+    try:
+        items = read_bulk_items(app.config['BULK_MAX_USERS'])
+    except ValueError as ve:
+        return api_response(False, {"message": str(ve)})
+
+    results = bulk_write(items, validate_user, insert_user_batch, hash_user_passwords)
+    invalidate_cache('user')
+
+    return bulk_response("Users imported", results)
+
 # API：用户注册
 @app.route("/api/register", methods=["POST"])
 def user_register():
@@ -447,22 +2877,24 @@ def user_register():
     existing_user = User.query.filter_by(username=username).first()
     if existing_user:
         return api_response(False, {"message": "Username already exists"})
-    
-    existing_ids = [int(user.id) for user in User.query.all() if user.id.isdigit()]
-    new_id = str(min(set(range(1, max(existing_ids) + 2)) - set(existing_ids))) if existing_ids else '1'
+
+    # 先计算哈希再分配 ID：分配 ID 会开启 SQLite 写事务，KDF 计算期间不能占着写锁
+    password_hash = password_hasher.hash(password)
+    new_id = allocate_user_id()
 
     new_user = User(
         id=new_id,
         first_name=first_name,
         last_name=last_name,
         username=username,
-        password=password,
+        password=password_hash,
         apply_status=apply_status,
         is_admin=is_admin
     )
 
     db.session.add(new_user)
     db.session.commit()
+    invalidate_cache('user')
 
     return api_response(True, {"message": "User registered successfully", "user_info": {
         "id": new_id,
@@ -473,58 +2905,200 @@ def user_register():
         "is_admin": is_admin
     }})
 
-# API：查看所有新闻
+# 新闻作者的用户名：按主键查 user 表的关联子查询，和新闻在同一条 SQL 里取出，不再逐条查询作者
+# news.author 没有外键，作者被删除后为 NULL
+NEWS_AUTHOR_NAME = select(User.username).where(User.id == News.author).correlate(News).scalar_subquery()
+
+# 新闻列表可选字段（content / details_content 需显式指定）
+NEWS_LIST_FIELDS = {"id", "title", "content", "details_content", "image_url", "author", "author_name",
+                    "publish_date", "is_published", "is_deleted", "view_count"}
+NEWS_DEFAULT_FIELDS = ["id", "title", "image_url", "author", "author_name", "publish_date", "view_count"]
+
+# 游标编码：base64("publish_date|id")
+# publish_date 使用数据库中的原始文本，库里混有带/不带微秒的两种格式，解析后再比较会导致翻页重复
+def encode_news_cursor(publish_date_raw, news_id):
+    raw = f"{publish_date_raw}|{news_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_news_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        publish_date_raw, news_id = raw.rsplit('|', 1)
+        return publish_date_raw, int(news_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+# 解析 is_published / is_deleted 之类的布尔查询参数
+def parse_bool_arg(name):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f"Invalid value for {name}: {value}")
+
+# API：查看所有新闻（按 publish_date, id 倒序的游标分页）
 @app.route("/api/news", methods=["GET"])
+@read_only
+@cached_response('news', 'user')
 def get_news():
-    news_list = News.query.all()
+    try:
+        limit = request.args.get('limit', app.config['NEWS_PAGE_SIZE'], type=int)
+        limit = max(1, min(limit, app.config['NEWS_MAX_PAGE_SIZE']))
+
+        fields_arg = request.args.get('fields')
+        fields = [f.strip() for f in fields_arg.split(',') if f.strip()] if fields_arg else NEWS_DEFAULT_FIELDS
+        unknown_fields = set(fields) - NEWS_LIST_FIELDS
+        if unknown_fields:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown_fields))}")
+
+        is_published = parse_bool_arg('is_published')
+        is_deleted = parse_bool_arg('is_deleted')
+        cursor = request.args.get('cursor')
+        cursor_key = decode_news_cursor(cursor) if cursor else None
+    except ValueError as ve:
+        return api_response(False, {"message": str(ve)})
 
-    news_data = []
-    
-    for news in news_list:
-        formatted_publish_date = news.publish_date.strftime('%Y-%m-%d %H:%M:%S')
+    # 游标需要 publish_date 的原始文本和 id，始终查询这两列
+    publish_date_raw = type_coerce(News.publish_date, db.String)
+    special_columns = {
+        "publish_date": formatted_datetime(News.publish_date),
+        "author_name": NEWS_AUTHOR_NAME,
+    }
+    columns = [special_columns[f].label(f) if f in special_columns else getattr(News, f) for f in fields]
+    query = db.session.query(News.id.label('cursor_id'), publish_date_raw.label('cursor_publish_date'), *columns)
 
-        news_info = {
-            "id": news.id,
-            "title": news.title,
-            "content": news.content,
-            "image_url": news.image_url,
-            "author": news.author,
-            "publish_date": formatted_publish_date,
-            "view_count": news.view_count
-        }
+    if is_published is not None:
+        query = query.filter(News.is_published == is_published)
+    if is_deleted is not None:
+        query = query.filter(News.is_deleted == is_deleted)
+    if cursor_key:
+        query = query.filter(tuple_(publish_date_raw, News.id) < cursor_key)
 
-        news_data.append(news_info)
+    rows = query.order_by(News.publish_date.desc(), News.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
 
-    return api_response(True, news_data)
+    # 前两列是游标列
+    news_data = [dict(zip(fields, row[2:])) for row in rows]
 
-# API：查看热门新闻
-@app.route("/api/news/hot", methods=["GET"])
-def get_hot_news():
-    daily_hots = News.query.order_by(News.view_count.desc()).limit(3).all()
-    recent_release = News.query.order_by(News.publish_date.desc()).limit(3).all()
+    next_cursor = encode_news_cursor(rows[-1].cursor_publish_date, rows[-1].cursor_id) if has_more else None
 
-    daily_hots_data = []
-    for news in daily_hots:
-        formatted_publish_date = news.publish_date.strftime('%Y-%m-%d %H:%M:%S')
-        daily_hots_data.append({
-            "id": news.id,
-            "title": news.title,
-            "author": news.author,
-            "publish_date": formatted_publish_date,
-            "view_count": news.view_count
-        })
+    return api_response(True, {
+        "items": news_data,
+        "next_cursor": next_cursor,
+        "has_more": has_more
+    })
 
-    recent_release_data = []
-    for news in recent_release:
-        formatted_publish_date = news.publish_date.strftime('%Y-%m-%d %H:%M:%S')
-        recent_release_data.append({
-            "id": news.id,
-            "title": news.title,
-            "author": news.author,
-            "publish_date": formatted_publish_date,
-            "view_count": news.view_count
+NEWS_EXPORT_COLUMNS = {
+    "id": News.id,
+    "title": News.title,
+    "content": News.content,
+    "details_content": News.details_content,
+    "image_url": News.image_url,
+    "author": News.author,
+    "author_name": NEWS_AUTHOR_NAME,
+    "publish_date": formatted_datetime(News.publish_date),
+    "is_published": News.is_published,
+    "is_deleted": News.is_deleted,
+    "view_count": News.view_count,
+}
+
+# API：导出新闻
+@app.route("/api/news/export", methods=["GET"])
+@read_only
+def export_news():
+    return export_response("news", NEWS_EXPORT_COLUMNS, News.publish_date, News.id)
+
+# 搜索结果的高亮：SQL 里先用正文中不会出现的控制字符标记命中位置，整段 HTML 转义后再换成 <mark>，
+# 标题和正文里用户写入的 HTML 不会原样返回
+SEARCH_MARK_OPEN = '\x02'
+SEARCH_MARK_CLOSE = '\x03'
+
+def render_search_highlight(value):
+    if value is None:
+        return None
+    return str(escape(value)).replace(SEARCH_MARK_OPEN, '<mark>').replace(SEARCH_MARK_CLOSE, '</mark>')
+
+# 把用户输入转成 FTS5 查询：每个词加引号作为短语，多个词之间为 AND
+def build_fts_query(keywords):
+    return " ".join('"' + keyword.replace('"', '""') + '"' for keyword in keywords)
+
+NEWS_AUTHOR_NAME_SQL = "(SELECT user.username FROM user WHERE user.id = news.author) AS author_name"
+
+# API：搜索新闻（标题权重高于正文，按 bm25 排序，返回高亮的标题和摘要）
+@app.route("/api/news/search", methods=["GET"])
+@read_only
+def search_news():
+    keywords = request.args.get('q', '').split()
+    if not keywords:
+        return api_response(False, {"message": "Missing search query: q"})
+
+    limit = request.args.get('limit', app.config['NEWS_SEARCH_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, app.config['NEWS_SEARCH_MAX_PAGE_SIZE']))
+    offset = max(0, request.args.get('offset', 0, type=int))
+
+    params = {"limit": limit + 1, "offset": offset, "mark_open": SEARCH_MARK_OPEN, "mark_close": SEARCH_MARK_CLOSE}
+
+    if app.config['NEWS_SEARCH_TOKENIZER'] == 'trigram' and min(len(keyword) for keyword in keywords) < 3:
+        # 关键词太短，trigram 索引用不上，退回 LIKE
+        conditions = []
+        for i, keyword in enumerate(keywords):
+            params[f"keyword_{i}"] = "%" + keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            conditions.append(f"(news.title LIKE :keyword_{i} ESCAPE '\\' OR news.content LIKE :keyword_{i} ESCAPE '\\' "
+                              f"OR news.details_content LIKE :keyword_{i} ESCAPE '\\')")
+        sql = (
+            "SELECT news.id, news.title, news.author, " + NEWS_AUTHOR_NAME_SQL + ", news.publish_date, news.view_count, "
+            "news.title AS title_highlight, substr(news.content, 1, 64) AS snippet, NULL AS rank "
+            "FROM news WHERE " + " AND ".join(conditions) + " AND COALESCE(news.is_deleted, 0) = 0 "
+            "ORDER BY news.publish_date DESC, news.id DESC LIMIT :limit OFFSET :offset"
+        )
+    else:
+        params["query"] = build_fts_query(keywords)
+        sql = (
+            "SELECT news.id, news.title, news.author, " + NEWS_AUTHOR_NAME_SQL + ", news.publish_date, news.view_count, "
+            "highlight(news_fts, 0, :mark_open, :mark_close) AS title_highlight, "
+            "snippet(news_fts, 1, :mark_open, :mark_close, '…', 32) AS snippet, "
+            "bm25(news_fts, 10.0, 1.0, 1.0) AS rank "
+            "FROM news_fts JOIN news ON news.id = news_fts.rowid "
+            "WHERE news_fts MATCH :query AND COALESCE(news.is_deleted, 0) = 0 "
+            "ORDER BY rank LIMIT :limit OFFSET :offset"
+        )
+
+    rows = db.session.execute(text(sql), params).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    results = []
+    for row in rows:
+        results.append({
+            "id": row.id,
+            "title": row.title,
+            "author": row.author,
+            "author_name": row.author_name,
+            "publish_date": str(row.publish_date)[:19] if row.publish_date else None,
+            "view_count": row.view_count,
+            "title_highlight": render_search_highlight(row.title_highlight),
+            "snippet": render_search_highlight(row.snippet),
+            "rank": row.rank
         })
 
+    return api_response(True, {
+        "items": results,
+        "next_offset": offset + limit if has_more else None,
+        "has_more": has_more
+    })
+
+# API：查看热门新闻（由内存中的排行榜直接返回）
+@app.route("/api/news/hot", methods=["GET"])
+@read_only
+@cached_response('news', 'user')
+def get_hot_news():
+    limit = request.args.get('limit', type=int)
+    daily_hots_data, recent_release_data = news_leaderboard.get(limit)
+
     return api_response(True, {
         "daily_hots": daily_hots_data,
         "recent_release": recent_release_data
@@ -532,16 +3106,19 @@ def get_hot_news():
 
 # API：查看新闻
 @app.route("/api/news/<int:id>", methods=["GET"])
+@read_only
 def get_news_by_id(id):
-    news = News.query.get(id)
-    if not news:
+    row = db.session.query(News, NEWS_AUTHOR_NAME).filter(News.id == id).first()
+    if not row:
         return api_response(False, {"message": "News not found"})
-    
-    news.view_count += 1
-    db.session.commit()
-    
-    author = User.query.get(news.author)
-    author_username = author.username if author else "Unknown"
+
+    news, author_name = row
+    # 先计入排行榜再记浏览：排行榜同步时按数据库 + 待写回计数补差额，顺序反过来这一次浏览可能被算两遍
+    view_count = (news.view_count or 0) + view_counter.get_pending(news.id) + 1
+    news_leaderboard.record_view(news, author_name, view_count)
+    view_counter.increment(news.id)
+
+    author_username = author_name if author_name is not None else "Unknown"
     
     formatted_publish_date = news.publish_date.strftime('%Y-%m-%d %H:%M:%S')
     news_data = {
@@ -549,7 +3126,7 @@ def get_news_by_id(id):
         "title": news.title,
         "author": author_username,
         "publish_date": formatted_publish_date,
-        "view_count": news.view_count,
+        "view_count": view_count,
         "content": news.content,
         "image_url": news.image_url,
         "is_published": news.is_published,
@@ -573,9 +3150,10 @@ def add_news():
     user_id = user_payload.get("user_id")
     if not user_id:
         return api_response(False, {"message": "Invalid token structure"})
-    
-    user = User.query.get(user_id)
-    if not user:
+
+    # Token 里已经有用户 ID，只需要确认用户存在并取出用户名
+    username = db.session.query(User.username).filter(User.id == user_id).scalar()
+    if username is None:
         return api_response(False, {"message": "User not found"})
     
     data = request.get_json()
@@ -591,7 +3169,7 @@ def add_news():
     new_news = News(
         title=title,
         content=content,
-        author=user.id,
+        author=user_id,
         image_url=image_url,
         is_published=is_published,
         details_content=details_content
@@ -599,6 +3177,8 @@ def add_news():
     
     db.session.add(new_news)
     db.session.commit()
+    news_leaderboard.add_news(new_news, username)
+    invalidate_cache('news')
     
     return api_response(True, {
         "message": "News added successfully",
@@ -606,7 +3186,7 @@ def add_news():
             "id": new_news.id,
             "title": new_news.title,
             "content": new_news.content,
-            "author": user.username,
+            "author": username,
             "image_url": new_news.image_url,
             "is_published": new_news.is_published,
             "details_content": new_news.details_content,
@@ -615,6 +3195,71 @@ def add_news():
         }
     })
 
+def validate_news(data):
+    title = data.get('title')
+    content = data.get('content')
+
+    if not (title and content):
+        return None, "Missing required fields: title, content"
+    if not (isinstance(title, str) and isinstance(content, str)):
+        return None, "Fields title, content must be strings"
+    if not all(isinstance(data.get(field), (str, type(None))) for field in ('image_url', 'details_content')):
+        return None, "Fields image_url, details_content must be strings or null"
+
+    is_published, error = parse_bulk_bool(data, 'is_published')
+    if error:
+        return None, error
+
+    return {
+        "title": title,
+        "content": content,
+        "image_url": data.get('image_url', None),
+        "is_published": is_published,
+        "details_content": data.get('details_content', None)
+    }, None
+
+def insert_news_batch(rows):
+    ids = db.session.execute(insert(News).returning(News.id, sort_by_parameter_order=True), rows).scalars()
+    return [(new_id, None) for new_id in ids]
+
+# API：批量新增新闻，作者为当前登录用户
+@app.route("/api/news/bulk", methods=["POST"])
+def add_news_bulk():
+    token = request.headers.get('Authorization')
+    if not token:
+        return api_response(False, {"message": "Token is missing"})
+
+    user_payload = verify_token(token)
+    if not user_payload or isinstance(user_payload, tuple):
+        return api_response(False, {"message": "Invalid or expired token"})
+
+    user_id = user_payload.get("user_id")
+    if not user_id:
+        return api_response(False, {"message": "Invalid token structure"})
+
+    if db.session.query(User.id).filter(User.id == user_id).scalar() is None:
+        return api_response(False, {"message": "User not found"})
+
+    try:
+        items = read_bulk_items()
+    except ValueError as ve:
+        return api_response(False, {"message": str(ve)})
+
+    author = user_id
+    publish_date = shanghai_now_naive()
+
+    def validate(item):
+        row, error = validate_news(item)
+        if row:
+            row.update(author=author, publish_date=publish_date)
+        return row, error
+
+    results = bulk_write(items, validate, insert_news_batch)
+    news_leaderboard.refresh_recent()
+    invalidate_cache('news')
+
+    return bulk_response("News imported", results)
+
 # API：删除新闻
 @app.route("/api/news/<int:id>", methods=["DELETE"])
 def delete_news(id):
@@ -636,9 +3281,124 @@ def delete_news(id):
     
     db.session.delete(news)
     db.session.commit()
+    news_leaderboard.remove_news(id)
+    invalidate_cache('news')
 
     return api_response(True, {"message": "News deleted successfully"})
 
+# 检查上传文件的扩展名，返回 (扩展名, 错误信息)
+def check_upload_extension(original_filename):
+    file_extension = os.path.splitext(original_filename)[-1].lower()
+
+    if not file_extension:
+        return None, "File has no extension"
+
+    if file_extension not in ALLOWED_UPLOAD_EXTENSIONS:
+        return None, f"File type {file_extension} is not allowed"
+
+    return file_extension, None
+
+def blob_path(sha256):
+    return os.path.join(app.config['UPLOAD_BLOB_FOLDER'], sha256[:2], sha256[2:4], sha256)
+
+def hash_file(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(app.config['UPLOAD_CHUNK_SIZE']), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+# 增加一个文件内容的引用；内容第一次出现时把临时文件移动到 blobs 目录，否则直接丢弃临时文件
+# 文件操作放在 UPSERT 之后、提交之前，借助 SQLite 的写锁和并发的删除操作串行化
+def store_blob(temp_path, sha256, size):
+    db.session.execute(text(
+        "INSERT INTO file_blob (sha256, size, ref_count) VALUES (:sha256, :size, 1) "
+        "ON CONFLICT (sha256) DO UPDATE SET ref_count = ref_count + 1"
+    ), {"sha256": sha256, "size": size})
+
+    path = blob_path(sha256)
+    if temp_path is None:
+        return
+    if os.path.exists(path):
+        os.remove(temp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+
+# 减少一个文件内容的引用，最后一个引用删除时才回收磁盘空间
+def release_blob(sha256):
+    ref_count = db.session.execute(text(
+        "UPDATE file_blob SET ref_count = ref_count - 1 WHERE sha256 = :sha256 RETURNING ref_count"
+    ), {"sha256": sha256}).scalar()
+
+    if ref_count is not None and ref_count <= 0:
+        db.session.execute(text("DELETE FROM file_blob WHERE sha256 = :sha256"), {"sha256": sha256})
+        enqueue_task("remove_blob_file", {"sha256": sha256})
+
+# 后台任务：删除已经没有引用的文件内容和它的缩略图
+# 先执行一条写语句拿到 SQLite 的写锁，和 store_blob 串行化：同样的内容在这之前又被上传过就不删除
+@background_task("remove_blob_file")
+def remove_blob_file(payload):
+    sha256 = payload["sha256"]
+    db.session.execute(text("DELETE FROM file_blob WHERE sha256 = :sha256 AND ref_count <= 0"), {"sha256": sha256})
+    if db.session.get(FileBlob, sha256) is None:
+        path = blob_path(sha256)
+        if os.path.exists(path):
+            os.remove(path)
+        image_derivatives.remove(sha256)
+    db.session.commit()
+
+# 根据下载链接中的文件名查 File 表找到磁盘上的文件；文件名必须和保存时完全一致，
+# 同样内容换个扩展名的链接（如把 .txt 改成 .html）找不到记录
+def resolve_stored_file(stored_filename):
+    file = File.query.filter_by(stored_filename=stored_filename).first()
+    if file is None:
+        return None, None
+
+    if file.sha256 and os.path.exists(blob_path(file.sha256)):
+        return blob_path(file.sha256), file
+
+    legacy_path = safe_join(app.config['UPLOAD_FOLDER'], stored_filename)
+    if legacy_path and os.path.isfile(legacy_path):
+        return legacy_path, file
+    return None, None
+
+# 在浏览器里直接显示的上传文件类型，其他类型（文本、PDF、Office 文档等）作为附件下载
+INLINE_UPLOAD_MIMETYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/bmp', 'image/webp'}
+
+# Content-Type 取自上传时记录的文件类型，不按链接里的文件名猜测
+def stored_file_mimetype(file):
+    return mimetypes.guess_type('file.' + file.file_type)[0] or 'application/octet-stream'
+
+# 把接收完的临时文件存入内容寻址存储并写入 File 表（同一文件系统上只是重命名，不复制数据）
+def store_uploaded_file(temp_path, size, sha256, original_filename, file_extension):
+    stored_filename = sha256 + file_extension
+
+    store_blob(temp_path, sha256, size)
+
+    new_file = File(
+        original_filename=secure_filename(original_filename),
+        stored_filename=stored_filename,
+        size=size,
+        file_type=file_extension.lstrip('.'),
+        sha256=sha256
+    )
+    db.session.add(new_file)
+    if app.config['IMAGE_DERIVATIVE_PREGENERATE'] and file_extension in IMAGE_DERIVATIVE_EXTENSIONS:
+        enqueue_task("generate_image_derivatives", {"sha256": sha256, "extension": file_extension},
+                     unique_key=f"derivatives:{sha256}")
+    db.session.commit()
+    invalidate_cache('file')
+
+    return {
+        "id": new_file.id,
+        "original_filename": original_filename,
+        "stored_filename": stored_filename,
+        "size": size,
+        "file_type": file_extension.lstrip('.'),
+        "sha256": sha256
+    }
+
 # API：上传文件
 @app.route("/api/upload", methods=["POST"])
 def upload_file():
@@ -651,56 +3411,295 @@ def upload_file():
         return api_response(False, {"message": "No selected file"})
     
     original_filename = file.filename
-    file_extension = os.path.splitext(original_filename)[-1].lower()
+    file_extension, error = check_upload_extension(original_filename)
 
-    if not file_extension:
-        return api_response(False, {"message": "File has no extension"})
-    
-    allowed_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.pdf', '.txt', '.docx', 'xlsx'}
-    if file_extension not in allowed_extensions:
-        return api_response(False, {"message": f"File type {file_extension} is not allowed"})
-    
-    stored_filename = str(uuid.uuid4()) + file_extension
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], stored_filename)
-    
-    file.save(file_path)
+    if error:
+        return api_response(False, {"message": error})
 
-    file_size = os.path.getsize(file_path)
-    
-    new_file = File(
-        original_filename=secure_filename(original_filename),
-        stored_filename=stored_filename,
-        size=file_size,
-        file_type=file_extension.lstrip('.')
+    # 请求体在解析时已经流式写入临时文件并算好了大小和哈希
+    temp_file = file.stream
+    temp_path = temp_file.detach()
+    file_info = store_uploaded_file(temp_path, temp_file.size, temp_file.sha256.hexdigest(),
+                                    original_filename, file_extension)
+
+    return api_response(True, {"message": "File uploaded successfully", "file_info": file_info})
+
+# 分片上传：每个会话在进程内缓存哈希状态，换了进程或重启后从临时文件重新计算
+upload_hashers = {}
+upload_hashers_lock = threading.Lock()
+upload_session_writers = set()      # 没有 fcntl 时正在写入的会话 ID
+
+def upload_session_path(session_id):
+    return os.path.join(app.config['UPLOAD_PARTIAL_FOLDER'], f"{session_id}.part")
+
+def upload_session_info(upload_session):
+    return {
+        "session_id": upload_session.id,
+        "original_filename": upload_session.original_filename,
+        "offset": upload_session.offset,
+        "length": upload_session.length
+    }
+
+def upload_session_response(is_success, upload_session, data=None):
+    response = api_response(is_success, data if data is not None else upload_session_info(upload_session))
+    response.headers['Upload-Offset'] = str(upload_session.offset)
+    if upload_session.length is not None:
+        response.headers['Upload-Length'] = str(upload_session.length)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+# 取出会话在 offset 处的哈希状态，没有缓存时读一遍已接收的部分
+def get_upload_hasher(upload_session):
+    with upload_hashers_lock:
+        cached = upload_hashers.pop(upload_session.id, None)
+
+    if cached and cached[0] == upload_session.offset:
+        return cached[1]
+
+    sha256 = hashlib.sha256()
+    with open(upload_session_path(upload_session.id), 'rb') as f:
+        remaining = upload_session.offset
+        while remaining > 0:
+            chunk = f.read(min(app.config['UPLOAD_CHUNK_SIZE'], remaining))
+            if not chunk:
+                break
+            sha256.update(chunk)
+            remaining -= len(chunk)
+    return sha256
+
+# 占用上传会话：同一个会话同时只允许一个请求写入，拿不到时返回 False
+# 客户端超时后续传时，旧的请求可能还在接收数据，两个请求同时写 .part 文件会把内容混在一起，
+# 缓存的哈希也就和文件内容对不上。对 .part 文件单独打开一个描述符加非阻塞的排他锁，
+# 多个 worker 进程之间同样有效；描述符关闭时锁自动释放，文件在持有锁期间被移走也不受影响
+@contextmanager
+def claim_upload_session(session_id):
+    if fcntl is None:
+        with upload_hashers_lock:
+            claimed = session_id not in upload_session_writers
+            upload_session_writers.add(session_id)
+        try:
+            yield claimed
+        finally:
+            if claimed:
+                with upload_hashers_lock:
+                    upload_session_writers.discard(session_id)
+        return
+
+    fd = os.open(upload_session_path(session_id), os.O_RDWR)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)
+
+# 后台任务：清理长时间没有写入的上传会话
+@background_task("cleanup_upload_sessions", interval=3600)
+def cleanup_upload_sessions(payload=None):
+    deadline = shanghai_now_naive() - timedelta(seconds=app.config['UPLOAD_SESSION_TTL'])
+    expired = UploadSession.query.filter(UploadSession.updated_at < deadline).all()
+
+    for upload_session in expired:
+        path = upload_session_path(upload_session.id)
+        if os.path.exists(path):
+            os.remove(path)
+        with upload_hashers_lock:
+            upload_hashers.pop(upload_session.id, None)
+        db.session.delete(upload_session)
+
+    if expired:
+        db.session.commit()
+
+# API：创建分片上传会话
+@app.route("/api/upload/sessions", methods=["POST"])
+def create_upload_session():
+    data = request.get_json()
+    original_filename = data.get('filename')
+    length = data.get('length')
+
+    if not original_filename:
+        return api_response(False, {"message": "Missing required field: filename"})
+
+    file_extension, error = check_upload_extension(original_filename)
+    if error:
+        return api_response(False, {"message": error})
+
+    if length is not None:
+        if not isinstance(length, int) or length < 0:
+            return api_response(False, {"message": "Invalid length"})
+        max_size = app.config['UPLOAD_SESSION_MAX_SIZE']
+        if max_size is not None and length > max_size:
+            return api_response(False, {"message": f"File is larger than {max_size} bytes"})
+
+
+    upload_session = UploadSession(
+        id=str(uuid.uuid4()),
+        original_filename=original_filename,
+        file_type=file_extension.lstrip('.'),
+        length=length,
+        offset=0,
+        updated_at=shanghai_now_naive()
     )
-    db.session.add(new_file)
+    open(upload_session_path(upload_session.id), 'wb').close()
+
+    db.session.add(upload_session)
     db.session.commit()
 
-    return api_response(True, {"message": "File uploaded successfully", "file_info": {
-        "original_filename": original_filename,
-        "stored_filename": stored_filename,
-        "size": file_size,
-        "file_type": file_extension.lstrip('.')
-    }})
+    return upload_session_response(True, upload_session)
+
+# API：查询分片上传会话的进度（HEAD 只返回 Upload-Offset 头）
+@app.route("/api/upload/sessions/<string:session_id>", methods=["GET"])
+def get_upload_session(session_id):
+    upload_session = db.session.get(UploadSession, session_id)
+    if not upload_session:
+        return api_response(False, {"message": "Upload session not found"}), 404
+
+    return upload_session_response(True, upload_session)
+
+# API：从 Upload-Offset 处追加数据，请求体为原始字节，边读边写边算哈希
+# Upload-Complete: 1 表示长度未知的上传已经结束
+@app.route("/api/upload/sessions/<string:session_id>", methods=["PATCH"])
+def append_upload_session(session_id):
+    upload_session = db.session.get(UploadSession, session_id)
+    if not upload_session:
+        return api_response(False, {"message": "Upload session not found"}), 404
+
+    try:
+        with claim_upload_session(session_id) as claimed:
+            if not claimed:
+                return upload_session_response(False, upload_session, {
+                    "message": "Another request is uploading to this session",
+                    "offset": upload_session.offset
+                }), 409
+            return write_upload_session(session_id)
+    except FileNotFoundError:
+        return api_response(False, {"message": "Upload session not found"}), 404
+
+# 在持有会话锁的情况下写入一段数据；全部接收完毕时存入文件表
+def write_upload_session(session_id):
+    # 拿到锁之前其他请求可能已经提交了新的 offset 或完成了上传，重新读取
+    db.session.expire_all()
+    upload_session = db.session.get(UploadSession, session_id)
+    if not upload_session:
+        return api_response(False, {"message": "Upload session not found"}), 404
+
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None or offset != upload_session.offset:
+        return upload_session_response(False, upload_session, {
+            "message": "Upload-Offset does not match the current offset",
+            "offset": upload_session.offset
+        }), 409
+
+    sha256 = get_upload_hasher(upload_session)
+    limit = upload_session.length
+    if limit is None:
+        limit = app.config['UPLOAD_SESSION_MAX_SIZE']
+
+    received = 0
+    too_large = False
+
+    with open(upload_session_path(session_id), 'r+b') as f:
+        # 之前中断的请求可能写了没提交的数据，从已确认的 offset 开始覆盖
+        f.seek(offset)
+        f.truncate()
+        try:
+            while True:
+                chunk = request.stream.read(app.config['UPLOAD_CHUNK_SIZE'])
+                if not chunk:
+                    break
+                if limit is not None and offset + received + len(chunk) > limit:
+                    chunk = chunk[:limit - offset - received]
+                    too_large = True
+                f.write(chunk)
+                sha256.update(chunk)
+                received += len(chunk)
+                if too_large:
+                    break
+        except ClientDisconnected:
+            # 连接断开时保留已经收到的部分，客户端查询 offset 后续传
+            pass
+
+    # 只有 offset 没有被其他请求改过时才提交
+    new_offset = offset + received
+    updated = UploadSession.query.filter_by(id=session_id, offset=offset).update({
+        "offset": new_offset,
+        "updated_at": shanghai_now_naive()
+    })
+    db.session.commit()
+
+    if not updated:
+        return api_response(False, {"message": "Concurrent upload to the same session"}), 409
+
+    upload_session = db.session.get(UploadSession, session_id)
+
+    if too_large:
+        return upload_session_response(False, upload_session, {
+            "message": "Upload exceeds the declared length",
+            "offset": new_offset
+        }), 413
+
+    if upload_session.length is None:
+        finished = request.headers.get('Upload-Complete') == '1'
+    else:
+        finished = new_offset == upload_session.length
+
+    if not finished:
+        with upload_hashers_lock:
+            upload_hashers[session_id] = (new_offset, sha256)
+        return upload_session_response(True, upload_session)
+
+    # 全部接收完毕：移动到上传目录并写入 File 表
+    file_info = store_uploaded_file(upload_session_path(session_id), new_offset, sha256.hexdigest(),
+                                    upload_session.original_filename, '.' + upload_session.file_type)
+
+    db.session.delete(upload_session)
+    db.session.commit()
+
+    return upload_session_response(True, upload_session, {"message": "File uploaded successfully", "file_info": file_info})
+
+# API：取消分片上传会话
+@app.route("/api/upload/sessions/<string:session_id>", methods=["DELETE"])
+def delete_upload_session(session_id):
+    upload_session = db.session.get(UploadSession, session_id)
+    if not upload_session:
+        return api_response(False, {"message": "Upload session not found"}), 404
+
+    path = upload_session_path(session_id)
+    if os.path.exists(path):
+        os.remove(path)
+    with upload_hashers_lock:
+        upload_hashers.pop(session_id, None)
+
+    db.session.delete(upload_session)
+    db.session.commit()
+
+    return api_response(True, {"message": "Upload session deleted successfully"})
+
+FILE_LIST_COLUMNS = [
+    ("id", File.id),
+    ("original_filename", File.original_filename),
+    ("stored_filename", File.stored_filename),
+    ("size", File.size),
+    ("file_type", File.file_type),
+    ("upload_date", formatted_datetime(File.upload_date)),
+]
 
 # API：列出已上传文件
 @app.route("/api/upload/list", methods=["GET"])
+@read_only
+@cached_response('file')
 def list_uploaded_files():
-    files_info = []
-    
-    files = File.query.all()
-    
-    for file in files:
-        files_info.append({
-            "id": file.id,
-            "original_filename": file.original_filename,
-            "stored_filename": file.stored_filename,
-            "size": file.size,
-            "file_type": file.file_type,
-            "upload_date": file.upload_date.strftime('%Y-%m-%d %H:%M:%S')
-        })
-    
-    return api_response(True, files_info)
+    return list_response(FILE_LIST_COLUMNS)
+
+# 后台任务：删除没有迁移进内容寻址存储的旧文件
+@background_task("remove_upload_file")
+def remove_upload_file(payload):
+    file_path = safe_join(app.config['UPLOAD_FOLDER'], payload["stored_filename"])
+    if file_path and os.path.isfile(file_path):
+        os.remove(file_path)
 
 # API：删除文件
 @app.route("/api/upload/<int:file_id>", methods=["DELETE"])
@@ -710,19 +3709,302 @@ def delete_file(file_id):
     if not file_to_delete:
         return api_response(False, {"message": "File not found"})
 
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], file_to_delete.stored_filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    if file_to_delete.sha256:
+        release_blob(file_to_delete.sha256)
+    else:
+        enqueue_task("remove_upload_file", {"stored_filename": file_to_delete.stored_filename})
 
     db.session.delete(file_to_delete)
     db.session.commit()
+    invalidate_cache('file')
 
     return api_response(True, {"message": "File deleted successfully"})
 
-# API：文件下载
+# 文件下载和静态文件的缓存头：强 ETag + 条件请求（304）+ Range 请求
+# 传入 download_name 时作为附件下载；统一带上 nosniff，浏览器不会把内容猜成 HTML 执行
+def send_cached_file(path, etag, mimetype=None, immutable=False, download_name=None):
+    response = send_file(os.path.abspath(path), mimetype=mimetype, etag=etag, conditional=True,
+                         as_attachment=download_name is not None, download_name=download_name)
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    if immutable:
+        response.headers['Cache-Control'] = f"public, max-age={app.config['IMMUTABLE_MAX_AGE']}, immutable"
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def file_stat_etag(path):
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+# API：文件下载（文件名是内容哈希或 UUID，同一个链接的内容不会变化）
 @app.route("/upload/<stored_filename>")
 def uploaded_file(stored_filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], stored_filename)
+    file_path, file = resolve_stored_file(stored_filename)
+    if not file_path or not os.path.isfile(file_path):
+        return api_response(False, {"message": "File not found"}), 404
+
+    mimetype = stored_file_mimetype(file)
+    download_name = None if mimetype in INLINE_UPLOAD_MIMETYPES else (file.original_filename or stored_filename)
+
+    # 只有链接的扩展名和记录的文件类型一致、类型能识别时才长期缓存，
+    # 否则每次重新验证，响应头以后有变化时不会被浏览器和代理一直缓存住
+    immutable = (os.path.splitext(stored_filename)[1].lower() == '.' + file.file_type.lower()
+                 and mimetype != 'application/octet-stream')
+    return send_cached_file(file_path, file.sha256 or file_stat_etag(file_path), mimetype, immutable=immutable,
+                            download_name=download_name)
+
+# 图片缩略图：保存在原文件旁边（blobs/.../<sha256>.w<宽度>.<格式>），文件存在即命中缓存
+# 生成在单独的线程池里进行，请求线程只等待结果；同一个缩略图同时只生成一次
+IMAGE_DERIVATIVE_EXTENSIONS = {'.png': 'png', '.jpg': 'jpg', '.jpeg': 'jpg', '.gif': 'png', '.bmp': 'png'}
+IMAGE_SAVE_OPTIONS = {
+    'jpg': ('JPEG', {'optimize': True, 'progressive': True}),
+    'png': ('PNG', {'optimize': True}),
+    'webp': ('WEBP', {'method': 4}),
+}
+
+class ImageDerivatives:
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pending = {}       # 缩略图路径 -> Future
+
+    @property
+    def available(self):
+        return Image is not None
+
+    @property
+    def webp_available(self):
+        return self.available and self.app.config['IMAGE_DERIVATIVE_WEBP'] and pil_features.check('webp')
+
+    def start(self):
+        if self.executor is None:
+            with self.lock:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.app.config['IMAGE_DERIVATIVE_WORKERS'],
+                                                       thread_name_prefix='image-derivatives')
+        return self.executor
+
+    def bucket(self, width):
+        sizes = sorted(self.app.config['IMAGE_DERIVATIVE_SIZES'])
+        index = bisect.bisect_left(sizes, width)
+        return sizes[min(index, len(sizes) - 1)]
+
+    def path(self, sha256, width, image_format):
+        return f"{blob_path(sha256)}.w{width}.{image_format}"
+
+    def render(self, source_path, target_path, width, image_format):
+        save_format, options = IMAGE_SAVE_OPTIONS[image_format]
+        with Image.open(source_path) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.LANCZOS)
+
+            if image_format == 'jpg':
+                image = image.convert('RGB')
+            elif image.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+                image = image.convert('RGBA')
+            if image_format == 'webp' and image.mode == 'P':
+                image = image.convert('RGBA')
+
+            if image_format != 'png':
+                options = {**options, 'quality': self.app.config['IMAGE_DERIVATIVE_QUALITY']}
+
+            # 先写到临时文件再重命名，并发请求不会读到写了一半的缩略图
+            temp_path = os.path.join(self.app.config['UPLOAD_PARTIAL_FOLDER'], f"{uuid.uuid4().hex}.{image_format}")
+            try:
+                image.save(temp_path, save_format, **options)
+                os.replace(temp_path, target_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        return target_path
+
+    def submit(self, sha256, width, image_format):
+        target_path = self.path(sha256, width, image_format)
+        executor = self.start()
+        with self.lock:
+            future = self.pending.get(target_path)
+            if future is not None:
+                return future
+            future = executor.submit(self.render, blob_path(sha256), target_path, width, image_format)
+            self.pending[target_path] = future
+        # 已经完成的 Future 会在当前线程里立即执行回调，所以放在锁外面
+        future.add_done_callback(lambda _: self.discard(target_path))
+        return future
+
+    def discard(self, target_path):
+        with self.lock:
+            self.pending.pop(target_path, None)
+
+    # 返回缩略图路径；生成失败或超时返回 None
+    def get(self, sha256, width, image_format):
+        target_path = self.path(sha256, width, image_format)
+        if os.path.exists(target_path):
+            return target_path
+
+        future = self.submit(sha256, width, image_format)
+        try:
+            return future.result(timeout=self.app.config['IMAGE_DERIVATIVE_WAIT'])
+        except FutureTimeoutError:
+            return None
+        except Exception as e:
+            print(f" * Failed to generate thumbnail {target_path}: {e}", file=sys.stderr)
+            return None
+
+    # 提交所有档位的生成任务，返回 Future 列表
+    def pregenerate(self, sha256, file_extension):
+        image_format = IMAGE_DERIVATIVE_EXTENSIONS.get(file_extension)
+        if not self.available or image_format is None or not os.path.exists(blob_path(sha256)):
+            return []
+        formats = [image_format, 'webp'] if self.webp_available else [image_format]
+        return [self.submit(sha256, width, derivative_format)
+                for width in self.app.config['IMAGE_DERIVATIVE_SIZES']
+                for derivative_format in formats
+                if not os.path.exists(self.path(sha256, width, derivative_format))]
+
+    def remove(self, sha256):
+        prefix = blob_path(sha256) + '.w'
+        directory = os.path.dirname(prefix)
+        if not os.path.isdir(directory):
+            return
+        for filename in os.listdir(directory):
+            path = os.path.join(directory, filename)
+            if path.startswith(prefix):
+                os.remove(path)
+
+image_derivatives = ImageDerivatives(app)
+
+# 后台任务：上传图片后生成所有档位的缩略图
+@background_task("generate_image_derivatives", max_attempts=3)
+def generate_image_derivatives(payload):
+    for future in image_derivatives.pregenerate(payload["sha256"], payload["extension"]):
+        future.result()
+
+# API：图片缩略图，如 /upload/<文件名>/thumb/320；format=auto（默认，按 Accept 选择 WebP）/ webp / original
+@app.route("/upload/<stored_filename>/thumb/<int:width>")
+def uploaded_file_thumbnail(stored_filename, width):
+    file_path, file = resolve_stored_file(stored_filename)
+    if not file_path or not os.path.isfile(file_path):
+        return api_response(False, {"message": "File not found"}), 404
+
+    sha256 = file.sha256
+    image_format = IMAGE_DERIVATIVE_EXTENSIONS.get('.' + file.file_type.lower())
+    if image_format is None:
+        return api_response(False, {"message": "File is not an image"}), 400
+
+    requested_format = request.args.get('format', 'auto')
+    if requested_format not in ('auto', 'webp', 'original'):
+        return api_response(False, {"message": "Invalid format"}), 400
+
+    vary_accept = False
+    if requested_format == 'webp' and image_derivatives.webp_available:
+        image_format = 'webp'
+    elif requested_format == 'auto' and image_derivatives.webp_available:
+        vary_accept = True
+        # 只认明确列出的 image/webp，image/* 或 */* 不代表支持 WebP
+        if 'image/webp' in request.headers.get('Accept', ''):
+            image_format = 'webp'
+
+    width = image_derivatives.bucket(width)
+    derivative_path = None
+    if image_derivatives.available and sha256:
+        derivative_path = image_derivatives.get(sha256, width, image_format)
+
+    if derivative_path is None:
+        # 没有安装 Pillow、生成失败或超时：返回原图，不长期缓存，之后还能拿到缩略图
+        response = send_cached_file(file_path, sha256 or file_stat_etag(file_path), stored_file_mimetype(file))
+    else:
+        response = send_cached_file(derivative_path, f"{sha256}-w{width}-{image_format}",
+                                    f"image/{'jpeg' if image_format == 'jpg' else image_format}", immutable=True)
+
+    if vary_accept:
+        response.vary.add('Accept')
+    return response
+
+# 前端静态文件清单：启动时扫描一次 static 目录，请求时不再逐个 stat
+STATIC_FOLDER = os.path.join(app.root_path, 'static')
+VITE_HASHED_ASSET = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')
+
+STATIC_COMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# 生成 .gz / .br 压缩文件，已有且不比原文件旧时跳过；压缩后没有变小的不保留
+# 先写临时文件再重命名，多个 worker 同时启动时不会读到写了一半的文件
+def precompress_static_file(path):
+    encodings = {}
+    source_mtime = os.path.getmtime(path)
+    data = None
+
+    for encoding, suffix in STATIC_COMPRESSED_SUFFIXES.items():
+        if encoding not in compressors:
+            continue
+        compressed_path = path + suffix
+        if not (os.path.exists(compressed_path) and os.path.getmtime(compressed_path) >= source_mtime):
+            if data is None:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            compressed = compress_bytes(encoding, data, app.config['STATIC_COMPRESSION_LEVELS'][encoding])
+            if len(compressed) >= len(data):
+                continue
+            temp_path = f"{compressed_path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(compressed)
+            os.replace(temp_path, compressed_path)
+        encodings[encoding] = {"path": compressed_path, "etag": f"{file_stat_etag(path)}-{encoding}"}
+    return encodings
+
+def build_static_manifest():
+    manifest = {}
+    for root, _, filenames in os.walk(STATIC_FOLDER):
+        names = set(filenames)
+        for filename in filenames:
+            # 压缩文件作为原文件的另一种编码提供，不单独列出
+            base, extension = os.path.splitext(filename)
+            if extension in ('.gz', '.br') and base in names:
+                continue
+            path = os.path.join(root, filename)
+            relative_path = os.path.relpath(path, STATIC_FOLDER).replace(os.sep, '/')
+            mimetype = mimetypes.guess_type(filename)[0]
+            compressible = (mimetype in COMPRESSIBLE_MIMETYPES
+                            and os.path.getsize(path) >= app.config['COMPRESSION_MIN_SIZE'])
+            manifest[relative_path] = {
+                "path": path,
+                "etag": file_stat_etag(path),
+                "immutable": bool(VITE_HASHED_ASSET.match(relative_path)),
+                "mimetype": mimetype,
+                "encodings": precompress_static_file(path) if compressible else None
+            }
+    return manifest
+
+static_manifest = build_static_manifest()
+
+def send_static_file_from_manifest(path):
+    entry = static_manifest.get(path)
+    if not entry:
+        return send_from_directory(STATIC_FOLDER, path)
+
+    encodings = entry["encodings"]
+    if encodings is None:
+        return send_cached_file(entry["path"], entry["etag"], immutable=entry["immutable"])
+
+    encoding = negotiate_encoding(encodings)
+    if encoding is None:
+        response = send_cached_file(entry["path"], entry["etag"], immutable=entry["immutable"])
+    else:
+        compressed = encodings[encoding]
+        response = send_cached_file(compressed["path"], compressed["etag"], entry["mimetype"], immutable=entry["immutable"])
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+# Prometheus 指标
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    if not app.config['METRICS_ENABLED']:
+        return api_response(False, {"message": "Metrics are disabled"}), 404
+
+    return app.response_class(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
 
 # 捕获所有非 API 请求并返回 index.html 或静态文件
 @app.route("/<path:path>")
@@ -730,17 +4012,53 @@ def catch_all(path):
     if path.startswith('api/'):
         return jsonify({"message": "API response"})
 
-    static_path = os.path.join(app.root_path, 'static', path)
+    if path in static_manifest:
+        return send_static_file_from_manifest(path)
     
-    if os.path.exists(static_path):
-        return send_from_directory(os.path.join(app.root_path, 'static'), path)
-    
-    return send_from_directory(os.path.join(app.root_path, 'static'), 'index.html')
+    return send_static_file_from_manifest('index.html')
 
 @app.route("/", methods=["GET"])
 def index():
-    return send_from_directory(os.path.join(app.root_path, 'static'), 'index.html')
+    return send_static_file_from_manifest('index.html')
+
+# 应用工厂：覆盖配置并建表；多进程部署时由 serve.py 的主进程在启动 worker 之前调用一次建表
+# 路由和模型定义在模块级别，连接池等在导入时就已创建的对象不受这里的覆盖影响
+def create_app(config=None, init_db=True):
+    global response_cache
+
+    if config:
+        app.config.update(config)
+        if 'RESPONSE_CACHE_BACKEND' in config:
+            response_cache = create_response_cache_backend()
+        if 'RATE_LIMIT_BACKEND' in config:
+            admission_control.backend = None
+
+    if init_db:
+        create_tables()
+
+    return app
+
+# 进程退出前写回内存中的状态：正在执行的后台任务、未写回的浏览量、请求指标、排队中的密码哈希任务、正在生成的缩略图，然后关闭数据库连接
+def shutdown_app():
+    task_worker.stop()
+    view_counter.flush()
+
+    if metrics_registry.thread is not None:
+        metrics_registry.write_snapshot()
+
+    for executor in (password_hasher.executor, password_hasher.bulk_executor):
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    # 还没开始的预生成任务直接取消，之后请求时会重新生成
+    if image_derivatives.executor is not None:
+        image_derivatives.executor.shutdown(wait=True, cancel_futures=True)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
 
+# 开发服务器，设置环境变量 FLASK_DEBUG=1 开启调试模式；生产环境使用 serve.py
 if __name__ == "__main__":
-    create_tables()
-    app.run(debug=True)
+    create_app()
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1')
@@ -0,0 +1,431 @@
+"""
+    serve.py --mode async 使用的 asyncio HTTP/1.1 服务器
+
+    网络读写全部在事件循环里完成，WSGI 应用只在请求体收完之后才交给线程池执行：
+    - 请求体先异步读入 SpooledTemporaryFile（小的在内存里，大的落到 spool_dir 下的临时文件），慢速上传不占用线程；
+      临时文件放在上传目录所在的文件系统（UPLOAD_PARTIAL_FOLDER），不占用系统 /tmp，
+      同时写到磁盘上的请求体总量约为并发上传数 × 单个请求体大小，可以用 max_body 限制单个请求体
+    - 文件下载（send_file）的响应体用 loop.sendfile 直接发送，慢速下载也不占用线程
+    - 其他响应体由线程池里的线程生成，放进有界队列，事件循环按客户端的速度发送
+    接口的处理函数和数据库访问方式不变，数据库查询仍然在线程池里同步执行
+"""
+import asyncio
+import signal
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_to_bytes
+
+MAX_HEADER_BYTES = 64 * 1024
+BODY_MEMORY_BYTES = 1024 * 1024     # 请求体超过该大小时写到临时文件
+READ_CHUNK_BYTES = 64 * 1024
+RESPONSE_QUEUE_CHUNKS = 16          # 线程生成响应体时最多领先客户端的块数
+
+STATUS_CONTINUE = b"HTTP/1.1 100 Continue\r\n\r\n"
+BUSY_BODY = b'{"status":"error","data":{"message":"Server is busy, please retry later"}}'
+
+class BadRequest(Exception):
+    status = 400
+
+class PayloadTooLarge(BadRequest):
+    status = 413
+
+# 作为 wsgi.file_wrapper 提供给 send_file，事件循环识别出它后改用 sendfile 发送
+class AsyncFileWrapper:
+    def __init__(self, file, block_size=8192):
+        self.file = file
+        self.block_size = block_size
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        data = self.file.read(self.block_size)
+        if data:
+            return data
+        raise StopIteration()
+
+    def seekable(self):
+        return hasattr(self.file, 'seekable') and self.file.seekable()
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+class AsyncWSGIServer:
+    def __init__(self, app, sock, threads, keepalive, access_log=False, max_queue=None, spool_dir=None,
+                 max_body=None):
+        self.app = app
+        self.sock = sock
+        self.threads = threads
+        self.max_queue = max_queue
+        self.spool_dir = spool_dir      # 大请求体的临时文件目录，None 为系统临时目录
+        self.max_body = max_body        # 单个请求体的字节数上限，None 为不限制
+        self.active = 0         # 已交给线程池、还没有处理完的请求数（只在事件循环里修改）
+        self.keepalive = keepalive
+        self.access_log = access_log
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+        self.connections = set()
+        self.server = None
+        self.server_name, self.server_port = sock.getsockname()[:2]
+
+    async def serve(self, stop_event):
+        self.sock.setblocking(False)
+        self.server = await asyncio.start_server(self.handle_connection, sock=self.sock,
+                                                 limit=MAX_HEADER_BYTES)
+        await stop_event.wait()
+
+        # 停止接收新连接，等已有连接上正在处理的请求完成
+        self.server.close()
+        for connection in list(self.connections):
+            connection.closing = True
+            if not connection.busy:
+                connection.writer.close()
+        while self.connections:
+            await asyncio.sleep(0.1)
+        self.executor.shutdown(wait=True)
+
+    async def handle_connection(self, reader, writer):
+        connection = Connection(self, reader, writer)
+        self.connections.add(connection)
+        try:
+            await connection.run()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.discard(connection)
+            writer.close()
+
+class Connection:
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.closing = False
+        self.busy = False
+        peer = writer.get_extra_info('peername') or ('', 0)
+        self.remote_addr, self.remote_port = peer[0], peer[1]
+
+    async def run(self):
+        while not self.closing:
+            try:
+                head = await asyncio.wait_for(self.reader.readuntil(b"\r\n\r\n"), self.server.keepalive)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                return
+            except asyncio.LimitOverrunError:
+                await self.send_simple(431, b"Request Header Fields Too Large")
+                return
+
+            self.busy = True
+            try:
+                keep_alive = await self.handle_request(head)
+            except BadRequest as e:
+                await self.send_simple(e.status, str(e).encode())
+                return
+            finally:
+                self.busy = False
+
+            if not keep_alive:
+                return
+
+    async def send_simple(self, status, message, content_type='text/plain', extra_headers=''):
+        reason = {400: "Bad Request", 413: "Payload Too Large", 431: "Request Header Fields Too Large",
+                  503: "Service Unavailable"}[status]
+        self.writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n{extra_headers}"
+                          f"Content-Length: {len(message)}\r\nConnection: close\r\n\r\n".encode() + message)
+        await self.writer.drain()
+
+    def parse_head(self, head):
+        lines = head.decode('latin-1').split("\r\n")
+        try:
+            method, target, protocol = lines[0].split(" ")
+        except ValueError:
+            raise BadRequest("Malformed request line")
+        if not protocol.startswith("HTTP/1."):
+            raise BadRequest("Unsupported protocol")
+
+        headers = []
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, sep, value = line.partition(":")
+            if not sep:
+                raise BadRequest("Malformed header")
+            headers.append((name.strip().lower(), value.strip()))
+        return method, target, protocol, headers
+
+    # 读取请求体：支持 Content-Length 和 chunked 两种方式，超过 max_body 时返回 413 并断开连接
+    async def read_body(self, headers, protocol):
+        header_map = dict(headers)
+        max_body = self.server.max_body
+        chunked = 'chunked' in header_map.get('transfer-encoding', '').lower()
+        remaining = 0
+        if not chunked:
+            try:
+                remaining = int(header_map.get('content-length', 0))
+            except ValueError:
+                raise BadRequest("Invalid Content-Length")
+            # 在发送 100 Continue 之前拒绝，客户端不必发送请求体
+            if max_body is not None and remaining > max_body:
+                raise PayloadTooLarge("Request body too large")
+
+        if header_map.get('expect', '').lower() == '100-continue' and protocol == "HTTP/1.1":
+            self.writer.write(STATUS_CONTINUE)
+            await self.writer.drain()
+
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_MEMORY_BYTES, dir=self.server.spool_dir)
+        try:
+            await self.receive_body(body, chunked, remaining, max_body)
+        except BaseException:
+            body.close()
+            raise
+
+        length = body.tell()
+        body.seek(0)
+        return body, length
+
+    async def receive_body(self, body, chunked, remaining, max_body):
+        if chunked:
+            received = 0
+            while True:
+                size_line = await self.reader.readuntil(b"\r\n")
+                try:
+                    size = int(size_line.split(b";")[0].strip(), 16)
+                except ValueError:
+                    raise BadRequest("Malformed chunk size")
+                if size == 0:
+                    # 跳过 trailer
+                    while await self.reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    break
+                received += size
+                if max_body is not None and received > max_body:
+                    raise PayloadTooLarge("Request body too large")
+                while size:
+                    data = await self.reader.read(min(size, READ_CHUNK_BYTES))
+                    if not data:
+                        raise asyncio.IncompleteReadError(b"", size)
+                    body.write(data)
+                    size -= len(data)
+                await self.reader.readexactly(2)
+        else:
+            while remaining > 0:
+                data = await self.reader.read(min(remaining, READ_CHUNK_BYTES))
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                body.write(data)
+                remaining -= len(data)
+
+    def build_environ(self, method, target, protocol, headers, body, length):
+        path, _, query = target.partition("?")
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote_to_bytes(path).decode('latin-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': str(self.server.server_name),
+            'SERVER_PORT': str(self.server.server_port),
+            'SERVER_PROTOCOL': protocol,
+            'REMOTE_ADDR': self.remote_addr,
+            'REMOTE_PORT': str(self.remote_port),
+            'CONTENT_LENGTH': str(length),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': body,
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+            'wsgi.file_wrapper': AsyncFileWrapper,
+        }
+        for name, value in headers:
+            if name == 'content-type':
+                environ['CONTENT_TYPE'] = value
+            elif name in ('content-length', 'transfer-encoding'):
+                continue
+            else:
+                key = 'HTTP_' + name.upper().replace('-', '_')
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    async def handle_request(self, head):
+        start = time.perf_counter()
+        method, target, protocol, headers = self.parse_head(head)
+        body, length = await self.read_body(headers, protocol)
+
+        connection_header = dict(headers).get('connection', '').lower()
+        keep_alive = (protocol == "HTTP/1.1" and connection_header != 'close') or connection_header == 'keep-alive'
+
+        # 等待线程的请求超过上限时直接返回 503，不再排队
+        server = self.server
+        if server.max_queue is not None and server.active >= server.threads + server.max_queue:
+            body.close()
+            await self.send_simple(503, BUSY_BODY, 'application/json', 'Retry-After: 1\r\n')
+            return False
+
+        environ = self.build_environ(method, target, protocol, headers, body, length)
+        loop = asyncio.get_running_loop()
+        response = ResponseChannel(loop)
+        server.active += 1
+
+        # WSGI 应用在线程池里执行，生成的响应体通过 ResponseChannel 交回事件循环
+        worker = loop.run_in_executor(self.server.executor, response.run_app, self.server.app, environ)
+        try:
+            status, response_headers = await response.started
+            keep_alive = await self.send_response(method, protocol, status, response_headers, response, keep_alive)
+        finally:
+            # 客户端断开或 HEAD 请求时丢弃剩余的响应体，让线程能够结束
+            response.cancelled = True
+            while not worker.done():
+                while not response.queue.empty():
+                    response.queue.get_nowait()
+                await asyncio.wait([worker], timeout=0.05)
+            if response.file_wrapper is not None:
+                response.file_wrapper.close()
+            body.close()
+            server.active -= 1
+
+        if self.server.access_log:
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f'{self.remote_addr} - "{method} {target} {protocol}" {status.split(" ")[0]} {elapsed:.1f}ms',
+                  file=sys.stderr, flush=True)
+        return keep_alive and not self.closing
+
+    async def send_response(self, method, protocol, status, headers, response, keep_alive):
+        header_names = {name.lower() for name, _ in headers}
+        chunked = False
+        if 'content-length' not in header_names and method != 'HEAD':
+            if protocol == "HTTP/1.1":
+                chunked = True
+                headers = headers + [('Transfer-Encoding', 'chunked')]
+            else:
+                keep_alive = False
+        headers = [(name, value) for name, value in headers if name.lower() != 'connection']
+        headers.append(('Connection', 'keep-alive' if keep_alive else 'close'))
+
+        head = f"{protocol} {status}\r\n" + "".join(f"{name}: {value}\r\n" for name, value in headers) + "\r\n"
+        self.writer.write(head.encode('latin-1'))
+
+        if method == 'HEAD':
+            await self.writer.drain()
+            return keep_alive
+
+        file_wrapper = response.file_wrapper
+        if file_wrapper is not None:
+            await self.writer.drain()
+            count = dict((name.lower(), value) for name, value in headers).get('content-length')
+            await asyncio.get_running_loop().sendfile(self.writer.transport, file_wrapper.file,
+                                                      offset=file_wrapper.file.tell(),
+                                                      count=int(count) if count else None)
+            return keep_alive
+
+        async for chunk in response.chunks():
+            if chunked:
+                self.writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            else:
+                self.writer.write(chunk)
+            await self.writer.drain()
+        if response.failed:
+            # 响应头已经发出，只能断开连接让客户端知道响应不完整
+            return False
+        if chunked:
+            self.writer.write(b"0\r\n\r\n")
+        await self.writer.drain()
+        return keep_alive
+
+# 在线程池里调用 WSGI 应用，把状态、响应头和响应体传回事件循环
+class ResponseChannel:
+    def __init__(self, loop):
+        self.loop = loop
+        self.started = loop.create_future()
+        self.queue = asyncio.Queue(RESPONSE_QUEUE_CHUNKS)
+        self.file_wrapper = None
+        self.cancelled = False
+        self.failed = False
+        self.status = None
+        self.headers = None
+        self.pending = []
+
+    def start(self, status, headers):
+        self.loop.call_soon_threadsafe(lambda: self.started.done() or self.started.set_result((status, headers)))
+
+    def put(self, item):
+        if not self.cancelled:
+            asyncio.run_coroutine_threadsafe(self.queue.put(item), self.loop).result()
+
+    def start_response(self, status, headers, exc_info=None):
+        if exc_info and self.started.done():
+            raise exc_info[1].with_traceback(exc_info[2])
+        self.status, self.headers = status, list(headers)
+        return self.pending.append
+
+    def run_app(self, app, environ):
+        result = None
+        started = False
+        try:
+            result = app(environ, self.start_response)
+            if isinstance(result, AsyncFileWrapper) and not self.pending:
+                # 文件由事件循环用 sendfile 发送，发送完后再关闭
+                self.file_wrapper, result = result, None
+                self.start(self.status, self.headers)
+                started = True
+                return
+
+            iterator = iter(result)
+            first = b"".join(self.pending)
+            for chunk in iterator:
+                if chunk:
+                    first += chunk
+                    break
+            self.start(self.status, self.headers)
+            started = True
+            if first:
+                self.put(first)
+            for chunk in iterator:
+                if self.cancelled:
+                    break
+                if chunk:
+                    self.put(chunk)
+        except Exception:
+            traceback.print_exc()
+            if started:
+                self.failed = True
+            else:
+                self.start("500 Internal Server Error", [('Content-Type', 'text/plain'), ('Content-Length', '21')])
+                self.put(b"Internal Server Error")
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+            self.put(None)
+
+    async def chunks(self):
+        while True:
+            chunk = await self.queue.get()
+            if chunk is None:
+                return
+            yield chunk
+
+def run(app, sock, threads, keepalive, access_log, on_shutdown, max_queue=None, spool_dir=None, max_body=None):
+    async def main():
+        loop = asyncio.get_running_loop()
+        stop_event = asyncio.Event()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, stop_event.set)
+        except NotImplementedError:
+            # Windows 的事件循环不支持信号处理，只能用 Ctrl+C 结束
+            pass
+        server = AsyncWSGIServer(app, sock, threads, keepalive, access_log, max_queue, spool_dir, max_body)
+        await server.serve(stop_event)
+
+    try:
+        asyncio.run(main())
+    finally:
+        on_shutdown()
@@ -0,0 +1,379 @@
+"""
+    API 压测：按给定数据量生成数据库，然后用 Flask 测试客户端和本机 WSGI 服务器（werkzeug，多线程）
+    以固定并发访问每个接口，统计吞吐量和 p50/p95/p99 延迟，并和保存的基准结果比较
+
+    用法：
+        python benchmarks/api_bench.py                                  # 默认数据量，两种模式都跑
+        python benchmarks/api_bench.py --users 10000 --news 50000 --concurrency 16
+        python benchmarks/api_bench.py --save-baseline benchmarks/baseline.json
+        python benchmarks/api_bench.py --baseline benchmarks/baseline.json  # 有退化时退出码为 1
+
+    在临时目录里运行（或 --workdir 指定的目录），不会修改 database/sqlite.db；不访问外部网络
+
+    删除、分片上传等会消耗数据的接口，在生成请求参数时（计时之前）先通过测试客户端创建好要操作的新闻、用户、
+    文件或上传会话，每个请求操作各自的对象。没有压测的路由：
+    - GET /metrics：默认关闭（返回 404），打开后每个请求都多一次计数，会影响其他接口的结果
+    - GET / 和 /<path>：返回前端构建产物，仓库里没有 static 目录时只有 404
+    - HEAD /api/upload/sessions/<id>：和 GET 是同一个处理函数
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+# 同一时间只处理一批的接口（其他请求直接返回 503），并发为 1 压测
+SERIAL_ROUTES = {"POST /api/users/bulk"}
+
+WORDS = ["新闻", "科技", "赛博朋克", "放假", "觉醒", "城市", "未来", "超级英雄", "联盟", "时空",
+         "flask", "python", "sqlite", "benchmark", "release", "update", "system", "network"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark every API route")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--news', type=int, default=5000)
+    parser.add_argument('--tokens', type=int, default=5000)
+    parser.add_argument('--files', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=200, help="requests per route")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mode', choices=['client', 'server', 'all'], default='all')
+    parser.add_argument('--routes', help="comma separated route names to run")
+    parser.add_argument('--no-cache', action='store_true', help="disable the response cache")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', help="directory for the benchmark database (default: a new temp dir)")
+    parser.add_argument('--output', help="write results to this JSON file")
+    parser.add_argument('--baseline', help="compare against this results JSON")
+    parser.add_argument('--save-baseline', help="write results as a new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed regression ratio (default 0.2)")
+    return parser.parse_args()
+
+def random_text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+# 生成一张 RGB 噪点 PNG，用于压测缩略图接口（不依赖 Pillow）
+def png_image(rng, width, height):
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    rows = b"".join(b"\x00" + bytes(rng.getrandbits(8) for _ in range(width * 3)) for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b""))
+
+# 生成测试数据：用户共用一个预先计算好的密码哈希，新闻和 Token 批量插入，文件通过上传接口写入
+def seed(m, args, rng):
+    with m.app.app_context():
+        m.create_tables()
+
+        password_hash = m.password_hasher.encode("benchmark")
+        ids = m.allocate_user_ids(args.users)
+        m.db.session.execute(m.insert(m.User), [{
+            "id": user_id,
+            "first_name": "Bench",
+            "last_name": f"User{index}",
+            "username": f"bench{index}",
+            "password": password_hash,
+            "apply_status": False,
+            "is_admin": index == 0,
+        } for index, user_id in enumerate(ids)])
+
+        now = m.shanghai_now_naive().replace(microsecond=0)
+        for start in range(0, args.news, 1000):
+            m.db.session.execute(m.insert(m.News), [{
+                "title": random_text(rng, 3),
+                "content": random_text(rng, 30),
+                "details_content": random_text(rng, 100),
+                "author": rng.choice(ids),
+                "publish_date": now - timedelta(minutes=index),
+                "is_published": True,
+                "is_deleted": False,
+                "view_count": rng.randint(0, 1000),
+            } for index in range(start, min(start + 1000, args.news))])
+
+        m.db.session.execute(m.insert(m.Token), [{
+            "user_id": rng.choice(ids),
+            "token": uuid.uuid4().hex,
+            "expiration": now + timedelta(hours=1),
+        } for _ in range(args.tokens)])
+        m.db.session.commit()
+
+    client = m.app.test_client()
+    stored_filenames = []
+    for index in range(args.files):
+        content = os.urandom(rng.randint(1024, 64 * 1024))
+        response = client.post('/api/upload', data={"file": (io.BytesIO(content), f"bench{index}.txt")},
+                               content_type='multipart/form-data')
+        stored_filenames.append(response.get_json()['data']['file_info']['stored_filename'])
+
+    response = client.post('/api/upload', data={"file": (io.BytesIO(png_image(rng, 800, 600)), "bench.png")},
+                           content_type='multipart/form-data')
+    image_filename = response.get_json()['data']['file_info']['stored_filename']
+
+    token = client.post('/api/login', json={"username": "bench0", "password": "benchmark"}).get_json()['data']['token']
+    return ids, stored_filenames, image_filename, token
+
+def multipart_body(filename, content):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+# 每个路由：名称 -> 生成 (method, path, headers, body) 的函数
+# 删除类接口和分片上传的函数在这里用测试客户端先建好要操作的对象，不计入延迟
+def build_routes(m, args, rng, ids, stored_filenames, image_filename, token):
+    client = m.app.test_client()
+    auth = {"Authorization": token}
+    json_headers = {"Content-Type": "application/json"}
+    admin_json = dict(auth, **json_headers)
+
+    def json_body(data):
+        return json.dumps(data).encode()
+
+    def new_user_data():
+        return {"first_name": "Bench", "last_name": "New", "username": f"new_{uuid.uuid4().hex[:12]}", "password": "benchmark"}
+
+    def upload():
+        body, content_type = multipart_body("bench.txt", os.urandom(16 * 1024))
+        return "POST", "/api/upload", {"Content-Type": content_type}, body
+
+    def create_session(length=None):
+        response = client.post('/api/upload/sessions', json={"filename": "bench.txt", "length": length})
+        return response.get_json()['data']['session_id']
+
+    # 每个请求写完一个新会话的全部数据，包括把文件移到存储目录、写入 File 表
+    def upload_session_patch():
+        content = os.urandom(64 * 1024)
+        session_id = create_session(len(content))
+        return ("PATCH", f"/api/upload/sessions/{session_id}",
+                {"Content-Type": "application/offset+octet-stream", "Upload-Offset": "0"}, content)
+
+    def delete_user():
+        user_id = client.post('/api/user/add', json=new_user_data()).get_json()['data']['user_info']['id']
+        return "DELETE", f"/api/user/{user_id}", auth, None
+
+    def delete_news():
+        news_id = client.post('/api/news/add', headers=auth, json={
+            "title": random_text(rng, 3), "content": random_text(rng, 30)}).get_json()['data']['news_info']['id']
+        return "DELETE", f"/api/news/{news_id}", auth, None
+
+    def delete_file():
+        response = client.post('/api/upload', data={"file": (io.BytesIO(os.urandom(16 * 1024)), "bench.txt")},
+                               content_type='multipart/form-data')
+        return "DELETE", f"/api/upload/{response.get_json()['data']['file_info']['id']}", {}, None
+
+    # 改密码用单独的用户，密码改成原值，不影响其他路由登录
+    client.post('/api/user/add', json={"first_name": "Bench", "last_name": "Password", "username": "bench_password",
+                                       "password": "benchmark"})
+    password_token = client.post('/api/login', json={"username": "bench_password", "password": "benchmark"}
+                                 ).get_json()['data']['token']
+    session_id = create_session()
+
+    return {
+        "GET /api/data": lambda: ("GET", "/api/data", {}, None),
+        "POST /api/data": lambda: ("POST", "/api/data", json_headers, json.dumps({"content": random_text(rng, 5)}).encode()),
+        "POST /api/data/bulk": lambda: ("POST", "/api/data/bulk", json_headers,
+                                        json_body([{"content": random_text(rng, 5)} for _ in range(100)])),
+        "POST /api/login": lambda: ("POST", "/api/login", json_headers,
+                                    json.dumps({"username": f"bench{rng.randrange(len(ids))}", "password": "benchmark"}).encode()),
+        "POST /api/register": lambda: ("POST", "/api/register", json_headers, json_body(new_user_data())),
+        "POST /api/user/add": lambda: ("POST", "/api/user/add", json_headers, json_body(new_user_data())),
+        "POST /api/users/bulk": lambda: ("POST", "/api/users/bulk", json_headers,
+                                         json_body([new_user_data() for _ in range(10)])),
+        "GET /api/user/info": lambda: ("GET", "/api/user/info", auth, None),
+        "PUT /api/user/password": lambda: ("PUT", "/api/user/password", dict(json_headers, Authorization=password_token),
+                                           json_body({"new_password": "benchmark"})),
+        "PUT /api/user/<id>": lambda: ("PUT", f"/api/user/{rng.choice(ids)}", admin_json,
+                                       json_body({"first_name": random_text(rng, 1)})),
+        "DELETE /api/user/<id>": delete_user,
+        "GET /api/users": lambda: ("GET", "/api/users", {}, None),
+        "GET /api/users/export": lambda: ("GET", "/api/users/export", {}, None),
+        "GET /api/news": lambda: ("GET", "/api/news?limit=20", {}, None),
+        "GET /api/news?fields": lambda: ("GET", "/api/news?limit=50&fields=id,title,publish_date&is_published=true", {}, None),
+        "GET /api/news/<id>": lambda: ("GET", f"/api/news/{rng.randint(1, args.news)}", {}, None),
+        "GET /api/news/hot": lambda: ("GET", "/api/news/hot", {}, None),
+        "GET /api/news/search": lambda: ("GET", f"/api/news/search?q={rng.choice(WORDS[10:])}", {}, None),
+        "POST /api/news/add": lambda: ("POST", "/api/news/add", admin_json,
+                                       json.dumps({"title": random_text(rng, 3), "content": random_text(rng, 30)}).encode()),
+        "POST /api/news/bulk": lambda: ("POST", "/api/news/bulk", admin_json, json_body(
+            [{"title": random_text(rng, 3), "content": random_text(rng, 30)} for _ in range(100)])),
+        "DELETE /api/news/<id>": delete_news,
+        "GET /api/news/export": lambda: ("GET", "/api/news/export?fields=id,title,publish_date", {}, None),
+        "POST /api/upload": upload,
+        "POST /api/upload/sessions": lambda: ("POST", "/api/upload/sessions", json_headers,
+                                              json_body({"filename": "bench.txt", "length": 64 * 1024})),
+        "GET /api/upload/sessions/<id>": lambda: ("GET", f"/api/upload/sessions/{session_id}", {}, None),
+        "PATCH /api/upload/sessions/<id>": upload_session_patch,
+        "DELETE /api/upload/sessions/<id>": lambda: ("DELETE", f"/api/upload/sessions/{create_session()}", {}, None),
+        "GET /api/upload/list": lambda: ("GET", "/api/upload/list", {}, None),
+        "DELETE /api/upload/<id>": delete_file,
+        "GET /upload/<file>": lambda: ("GET", f"/upload/{rng.choice(stored_filenames)}", {}, None),
+        "GET /upload/<file>/thumb": lambda: ("GET", f"/upload/{image_filename}/thumb/{rng.choice([160, 320, 640])}", {}, None),
+    }
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def run_route(send, make_request, total, concurrency):
+    # 请求参数提前生成，避免随机数生成和 JSON 编码计入延迟
+    requests = [make_request() for _ in range(total)]
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(spec):
+        nonlocal errors
+        start = time.perf_counter()
+        ok = send(*spec)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, requests))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / wall, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+def client_sender(m):
+    local = threading.local()
+
+    def send(method, path, headers, body):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = m.app.test_client()
+        response = client.open(path, method=method, headers=headers, data=body)
+        response.get_data()
+        response.close()
+        return response.status_code < 400
+    return send
+
+def server_sender(host, port):
+    def send(method, path, headers, body):
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status < 400
+        finally:
+            connection.close()
+    return send
+
+def print_results(mode, results):
+    print(f"\n[{mode}]")
+    print(f"{'route':<36} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, result in results.items():
+        print(f"{name:<36} {result['rps']:>9} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9} {result['errors']:>7}")
+
+# 吞吐量下降或 p95 延迟上升超过 tolerance 记为退化
+def compare(results, baseline, tolerance):
+    regressions = []
+    for mode, routes in results.items():
+        for name, result in routes.items():
+            base = baseline.get(mode, {}).get(name)
+            if not base:
+                continue
+            if result["rps"] < base["rps"] * (1 - tolerance):
+                regressions.append(f"{mode} {name}: rps {base['rps']} -> {result['rps']}")
+            if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{mode} {name}: p95 {base['p95_ms']} ms -> {result['p95_ms']} ms")
+    return regressions
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='api_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    output_paths = [os.path.abspath(path) if path else None for path in (args.output, args.baseline, args.save_baseline)]
+    os.chdir(workdir)
+
+    import app as m
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    if args.no_cache:
+        m.response_cache = None
+
+    # 压测的是接口本身的吞吐量，关闭限流和并发上限
+    m.app.config['RATE_LIMIT_ENABLED'] = False
+    m.app.config['MAX_CONCURRENT_REQUESTS'] = None
+
+    print(f"Seeding {args.users} users, {args.news} news, {args.tokens} tokens, {args.files} files in {workdir}")
+    ids, stored_filenames, image_filename, token = seed(m, args, rng)
+    routes = build_routes(m, args, rng, ids, stored_filenames, image_filename, token)
+    if args.routes:
+        selected = {name.strip() for name in args.routes.split(',')}
+        routes = {name: make_request for name, make_request in routes.items() if name in selected}
+
+    def run_routes(send):
+        return {name: run_route(send, make_request, args.requests, 1 if name in SERIAL_ROUTES else args.concurrency)
+                for name, make_request in routes.items()}
+
+    results = {}
+    if args.mode in ('client', 'all'):
+        results["client"] = run_routes(client_sender(m))
+        print_results("client", results["client"])
+
+    if args.mode in ('server', 'all'):
+        server = make_server('127.0.0.1', 0, m.app, threaded=True, request_handler=QuietRequestHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            results["server"] = run_routes(server_sender('127.0.0.1', server.server_port))
+        finally:
+            server.shutdown()
+        print_results("server", results["server"])
+
+    output_path, baseline_path, save_baseline_path = output_paths
+    report = {
+        "created": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "config": {key: getattr(args, key) for key in ('users', 'news', 'tokens', 'files', 'requests', 'concurrency', 'no_cache')},
+        **results
+    }
+    for path in (output_path, save_baseline_path):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if baseline_path:
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions (tolerance {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {baseline_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+    不同密码哈希参数下 /api/login 的吞吐量（次/秒）
+    每组参数先注册一个用户，再用多个线程并发登录；哈希线程数由 PASSWORD_HASH_WORKERS 控制
+
+    用法：python benchmarks/password_bench.py [登录次数] [并发线程数]
+    在临时目录里运行，不会修改 database/sqlite.db
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+LOGINS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+CLIENTS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+SETTINGS = [
+    ("scrypt n=2^12", {'PASSWORD_HASH_METHOD': 'scrypt', 'PASSWORD_SCRYPT_N': 2 ** 12}),
+    ("scrypt n=2^14", {'PASSWORD_HASH_METHOD': 'scrypt', 'PASSWORD_SCRYPT_N': 2 ** 14}),
+    ("scrypt n=2^15", {'PASSWORD_HASH_METHOD': 'scrypt', 'PASSWORD_SCRYPT_N': 2 ** 15}),
+    ("pbkdf2 100k", {'PASSWORD_HASH_METHOD': 'pbkdf2_sha256', 'PASSWORD_PBKDF2_ITERATIONS': 100000}),
+    ("pbkdf2 600k", {'PASSWORD_HASH_METHOD': 'pbkdf2_sha256', 'PASSWORD_PBKDF2_ITERATIONS': 600000}),
+]
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+os.chdir(tempfile.mkdtemp(prefix='password_bench_'))
+
+import app as m
+
+def login(username):
+    client = m.app.test_client()
+    response = client.post('/api/login', json={"username": username, "password": "benchmark"})
+    return response.get_json()['status'] == 'success'
+
+def bench(index, name, config):
+    m.app.config.update(config)
+    username = f"bench{index}"
+    client = m.app.test_client()
+    client.post('/api/register', json={
+        "first_name": "bench", "last_name": "bench", "username": username, "password": "benchmark"
+    })
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CLIENTS) as pool:
+        ok = sum(pool.map(login, [username] * LOGINS))
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:<14} {LOGINS / elapsed:8.1f} logins/s  {elapsed / LOGINS * 1000:7.1f} ms/login  ({ok}/{LOGINS} ok)")
+
+if __name__ == "__main__":
+    m.app.config['RATE_LIMIT_ENABLED'] = False
+    with m.app.app_context():
+        m.create_tables()
+    print(f"{LOGINS} logins, {CLIENTS} client threads, {m.app.config['PASSWORD_HASH_WORKERS']} hash workers")
+    for index, (name, config) in enumerate(SETTINGS):
+        bench(index, name, config)
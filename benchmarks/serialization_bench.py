@@ -0,0 +1,78 @@
+"""
+    对比列表接口的两种序列化方式（10 万行 TestData / File）：
+    - legacy：查询完整 ORM 对象，逐行 strftime，再用 jsonify
+    - tuple：只查询需要的列（元组），日期在 SQL 里格式化，用 json_dumps 序列化
+    - stream：和 tuple 相同，但用 yield_per 逐批流式输出
+
+    用法：python benchmarks/serialization_bench.py [行数]
+    在临时目录里运行，不会修改 database/sqlite.db
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+REPEAT = 3
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+os.chdir(tempfile.mkdtemp(prefix='serialization_bench_'))
+
+import app as m
+from flask import jsonify
+
+def seed():
+    with m.app.app_context():
+        m.create_tables()
+        now = datetime.now().replace(microsecond=0)
+        m.db.session.execute(m.TestData.__table__.insert(), [{"content": f"row {i}"} for i in range(ROWS)])
+        m.db.session.execute(m.File.__table__.insert(), [{
+            "original_filename": f"file{i}.txt",
+            "stored_filename": f"{i:032x}.txt",
+            "size": i,
+            "file_type": "txt",
+            "upload_date": now,
+        } for i in range(ROWS)])
+        m.db.session.commit()
+
+def legacy_files():
+    files = m.File.query.all()
+    data = [{
+        "id": file.id,
+        "original_filename": file.original_filename,
+        "stored_filename": file.stored_filename,
+        "size": file.size,
+        "file_type": file.file_type,
+        "upload_date": file.upload_date.strftime('%Y-%m-%d %H:%M:%S')
+    } for file in files]
+    return jsonify({"status": "success", "data": data}).get_data()
+
+def tuple_files():
+    return m.list_response(m.FILE_LIST_COLUMNS).get_data()
+
+def stream_files():
+    names = [name for name, _ in m.FILE_LIST_COLUMNS]
+    query = m.list_query(m.FILE_LIST_COLUMNS).yield_per(m.app.config['JSON_STREAM_BATCH_SIZE'])
+    return b''.join(m.api_response_stream(names, query).response)
+
+def bench(name, func):
+    best = None
+    for _ in range(REPEAT):
+        with m.app.test_request_context('/api/upload/list'):
+            start = time.perf_counter()
+            size = len(func())
+            elapsed = time.perf_counter() - start
+            m.db.session.remove()
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<8} {best * 1000:9.1f} ms  {size / 1024 / 1024:7.2f} MiB")
+    return best
+
+if __name__ == "__main__":
+    seed()
+    print(f"{ROWS} rows, best of {REPEAT}, encoder: {'orjson' if m.orjson else 'json'}")
+    legacy = bench("legacy", legacy_files)
+    fast = bench("tuple", tuple_files)
+    bench("stream", stream_files)
+    print(f"speedup  {legacy / fast:9.2f}x")
@@ -0,0 +1,292 @@
+"""
+    生产环境启动入口：多进程 + 每个进程固定大小的线程池，关闭调试模式
+
+    用法：
+        python serve.py --host 0.0.0.0 --port 5000 --workers 4 --threads 8
+
+    - 主进程先建表/执行迁移（只执行一次），再监听端口，然后启动 worker 子进程共享同一个监听 socket
+    - worker 是独立的 Python 进程（不是 fork 出来的），SQLite 连接和后台线程不会跨进程共享
+    - SIGTERM / SIGINT：停止接收新连接，等正在处理的请求完成、写回内存中的浏览量后退出
+    - SIGHUP：平滑重启，先执行迁移、启动新的 worker（会加载新代码），再让旧的 worker 按上面的方式退出
+    - worker 异常退出时主进程会重新启动一个
+    - 多个 worker 时响应缓存和限流计数改用 sqlite 后端，使各进程之间的缓存失效和限流计数能够同步；
+      /metrics 返回所有 worker 的合计（各进程定期把计数写到 database/metrics，主进程启动时清空）
+    - Windows 不支持在进程间传递监听 socket，只以单进程方式运行
+    - --mode async：连接由 asyncio 事件循环处理（见 async_server.py），请求体收完后才占用线程，
+      文件下载用 sendfile 发送，适合大量慢速上传/下载的连接；--threads 只限制同时执行的接口数量。
+      请求体超过 1MB 时先落到 upload/.partial 下的临时文件，接口再从中读取（上传的文件会多写一次磁盘），
+      --max-body 限制单个请求体大小（默认取 MAX_CONTENT_LENGTH，不限制），大文件应使用分片上传会话
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the app with multiple worker processes")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    parser.add_argument('--threads', type=int, default=8, help="request threads per worker, keep <= DB_POOL_SIZE")
+    parser.add_argument('--mode', choices=['threaded', 'async'], default='threaded',
+                        help="threaded: one thread per connection; async: event loop for network I/O")
+    parser.add_argument('--backlog', type=int, default=2048)
+    parser.add_argument('--max-queue', type=int, default=256,
+                        help="requests waiting for a free thread before new ones get 503, -1 for unlimited")
+    parser.add_argument('--keepalive', type=float, default=5, help="idle keep-alive timeout in seconds")
+    parser.add_argument('--graceful-timeout', type=float, default=30, help="seconds to wait for workers to exit")
+    parser.add_argument('--access-log', action='store_true')
+    parser.add_argument('--max-body', type=int,
+                        help="async mode: largest request body in MB, larger ones get 413 (default: MAX_CONTENT_LENGTH)")
+    # 以下参数由主进程传给子进程
+    parser.add_argument('--init-db', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--reset-metrics', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--worker-fd', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--shared-cache', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def load_app(args, init_db):
+    import app as application
+
+    config = None
+    if args.shared_cache:
+        config = {'RESPONSE_CACHE_BACKEND': 'sqlite', 'RATE_LIMIT_BACKEND': 'sqlite', 'METRICS_SHARED': True}
+    return application, application.create_app(config, init_db=init_db)
+
+BUSY_RESPONSE = (b"HTTP/1.1 503 Service Unavailable\r\nContent-Type: application/json\r\nRetry-After: 1\r\n"
+                 b"Connection: close\r\nContent-Length: 74\r\n\r\n"
+                 b'{"status":"error","data":{"message":"Server is busy, please retry later"}}')
+
+def max_queue(args):
+    return None if args.max_queue < 0 else args.max_queue
+
+def max_body(args, flask_app):
+    return flask_app.config['MAX_CONTENT_LENGTH'] if args.max_body is None else args.max_body * 1024 * 1024
+
+def build_server(args, flask_app, sock):
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+    class RequestHandler(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"
+        timeout = args.keepalive
+
+        def log_request(self, *log_args, **log_kwargs):
+            if args.access_log:
+                super().log_request(*log_args, **log_kwargs)
+
+    # 和 ThreadingMixIn 不同，线程数固定，不会因为并发连接过多而无限创建线程
+    class PooledWSGIServer(BaseWSGIServer):
+        multithread = True
+        daemon_threads = True
+
+        def __init__(self, *server_args, **server_kwargs):
+            super().__init__(*server_args, **server_kwargs)
+            self.pool = ThreadPoolExecutor(max_workers=args.threads, thread_name_prefix='request')
+            self.active_lock = threading.Lock()
+            self.active = 0     # 交给线程池、还没有处理完的连接数
+
+        # 等待线程的连接超过上限时直接返回 503，不再排队
+        def process_request(self, request, client_address):
+            limit = max_queue(args)
+            with self.active_lock:
+                if limit is not None and self.active >= args.threads + limit:
+                    self.reject(request)
+                    return
+                self.active += 1
+            self.pool.submit(self.process_request_thread, request, client_address)
+
+        # 先读掉已经到达的请求数据再关闭，否则客户端可能收到 RST 而不是 503
+        def reject(self, request):
+            try:
+                request.setblocking(False)
+                while request.recv(65536):
+                    pass
+            except OSError:
+                pass
+            try:
+                request.send(BUSY_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+
+        def process_request_thread(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                with self.active_lock:
+                    self.active -= 1
+
+    host, port = sock.getsockname()[:2]
+    return PooledWSGIServer(host, port, flask_app, handler=RequestHandler, fd=sock.fileno())
+
+def run_async_worker(args, sock):
+    import async_server
+
+    application, flask_app = load_app(args, init_db=False)
+    if os.name == 'posix':
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    print(f" * Worker {os.getpid()} started (async, {args.threads} threads)", flush=True)
+    try:
+        async_server.run(flask_app, sock, args.threads, args.keepalive, args.access_log, application.shutdown_app,
+                         max_queue(args), flask_app.config['UPLOAD_PARTIAL_FOLDER'], max_body(args, flask_app))
+    finally:
+        print(f" * Worker {os.getpid()} stopped", flush=True)
+
+def run_worker(args, sock):
+    if args.mode == 'async':
+        run_async_worker(args, sock)
+        return
+
+    application, flask_app = load_app(args, init_db=False)
+    server = build_server(args, flask_app, sock)
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    if os.name == 'posix':
+        # Ctrl+C 会发给整个进程组，由主进程统一处理
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    print(f" * Worker {os.getpid()} started ({args.threads} threads)", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        # 等正在处理的请求完成
+        server.pool.shutdown(wait=True)
+        application.shutdown_app()
+        print(f" * Worker {os.getpid()} stopped", flush=True)
+
+class Master:
+    def __init__(self, args, sock):
+        self.args = args
+        self.sock = sock
+        self.workers = {}       # pid -> Popen
+        self.retiring = {}      # 平滑重启时等待退出的旧 worker，pid -> (Popen, 截止时间)
+        self.stopping = False
+        self.reloading = False
+
+    def command(self, *extra):
+        command = [sys.executable, os.path.abspath(__file__), '--threads', str(self.args.threads),
+                   '--keepalive', str(self.args.keepalive), '--mode', self.args.mode, '--max-queue', str(self.args.max_queue)]
+        if self.args.access_log:
+            command.append('--access-log')
+        if self.args.max_body is not None:
+            command += ['--max-body', str(self.args.max_body)]
+        if self.args.workers > 1:
+            command.append('--shared-cache')
+        return command + list(extra)
+
+    def init_db(self, *extra):
+        subprocess.run(self.command('--init-db', *extra), check=True)
+
+    def spawn(self):
+        fd = self.sock.fileno()
+        process = subprocess.Popen(self.command('--worker-fd', str(fd)), pass_fds=(fd,))
+        self.workers[process.pid] = process
+
+    def retire(self, processes):
+        deadline = time.monotonic() + self.args.graceful_timeout
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+            self.retiring[process.pid] = (process, deadline)
+
+    def reap(self):
+        for pid, process in list(self.workers.items()):
+            if process.poll() is not None:
+                del self.workers[pid]
+                if not self.stopping:
+                    print(f" * Worker {pid} exited with code {process.returncode}, restarting", flush=True)
+                    time.sleep(1)
+                    self.spawn()
+
+        now = time.monotonic()
+        for pid, (process, deadline) in list(self.retiring.items()):
+            if process.poll() is not None:
+                del self.retiring[pid]
+            elif now > deadline:
+                process.kill()
+
+    def reload(self):
+        self.reloading = False
+        print(" * Reloading workers", flush=True)
+        try:
+            self.init_db()
+        except subprocess.CalledProcessError:
+            print(" * Migration failed, keeping the current workers", flush=True)
+            return
+        old = list(self.workers.values())
+        self.workers = {}
+        for _ in range(self.args.workers):
+            self.spawn()
+        self.retire(old)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        signal.signal(signal.SIGHUP, self.handle_reload)
+
+        # 平滑重启时保留计数，只在主进程启动时清空上一次运行留下的指标
+        self.init_db('--reset-metrics')
+        for _ in range(self.args.workers):
+            self.spawn()
+
+        while not self.stopping:
+            if self.reloading:
+                self.reload()
+            self.reap()
+            time.sleep(0.2)
+
+        print(" * Shutting down", flush=True)
+        self.retire(list(self.workers.values()))
+        self.workers = {}
+        while self.retiring:
+            self.reap()
+            time.sleep(0.2)
+        self.sock.close()
+
+    def handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def handle_reload(self, signum, frame):
+        self.reloading = True
+
+def main():
+    args = parse_args()
+
+    if args.init_db:
+        application, _ = load_app(args, init_db=True)
+        if args.reset_metrics:
+            application.metrics_registry.reset_shared()
+        application.shutdown_app()
+        return
+
+    if args.worker_fd is not None:
+        sock = socket.socket(fileno=args.worker_fd)
+        run_worker(args, sock)
+        return
+
+    sock = socket.create_server((args.host, args.port), backlog=args.backlog)
+    print(f" * Serving on http://{args.host}:{args.port} with {args.workers} workers x {args.threads} threads ({args.mode})", flush=True)
+
+    if os.name != 'posix':
+        load_app(args, init_db=True)
+        run_worker(args, sock)
+        return
+
+    sock.set_inheritable(True)
+    Master(args, sock).run()
+
+if __name__ == "__main__":
+    main()